@@ -0,0 +1,347 @@
+"""Headless end-to-end benchmark of the autoDS pipeline.
+
+Generates synthetic regression datasets, runs every stage the app runs
+(Parquet load, setup, model search, tuning, plots, preview form, single and
+batch API predictions) and records wall time and peak memory per stage with ``core.metrics``.
+Results are written as JSON and compared against a stored baseline:
+
+    python ./src/benchmark.py                        # all cases
+    python ./src/benchmark.py --case small --stages load setup compare
+    python ./src/benchmark.py --save-baseline        # store as new baseline
+    python ./src/benchmark.py --imports-only         # startup import check
+
+It also checks in a fresh interpreter that the modules loaded before the
+first page is shown stay within ``--import-budget`` seconds and do not pull
+in PyCaret or another heavy ML library. The exit code is 1 if that check
+fails or a stage got slower than ``--tolerance`` times its baseline.
+"""
+
+import argparse
+import datetime as dt
+import io
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dotenv import load_dotenv
+
+from core.metrics import RunLog
+
+RESULTS_DIR = Path('./src/_static/benchmarks')
+BASELINE = RESULTS_DIR / 'baseline.json'
+
+STAGES = ['load', 'setup', 'compare', 'tune', 'plots', 'preview', 'api_single', 'api_batch']
+
+CASES = {
+    'small': dict(rows=2_000, numeric=8, categorical=2, cardinality=10, datetimes=1),
+    'wide': dict(rows=5_000, numeric=60, categorical=6, cardinality=50, datetimes=1),
+    'tall': dict(rows=100_000, numeric=10, categorical=3, cardinality=20, datetimes=1),
+    'high_cardinality': dict(rows=20_000, numeric=10, categorical=4, cardinality=5_000, datetimes=2),
+}
+
+TARGET = 'target'
+
+# What the app imports before the first page is shown
+STARTUP_IMPORTS = [
+    'streamlit', 'st_pages', 'plotly.express',
+    'core.warmup', 'core.jobs', 'core.metrics', 'core.data', 'core.domains', 'core.eda',
+    'core.registry', 'core.deployment', 'core.compiler', 'core.scoring', 'core.explorer', 'core.store',
+]
+# Must only be imported by the pages and functions that use them
+HEAVY_IMPORTS = ['pycaret', 'sklearn', 'shap', 'lightgbm', 'xgboost', 'catboost', 'optuna', 'ydata_profiling']
+
+IMPORT_CHECK = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+print(json.dumps({{'seconds': time.perf_counter() - started, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def generate(rows, numeric, categorical, cardinality, datetimes, seed=0):
+    """Synthetic regression data with a known, partly non-linear target."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    target = np.zeros(rows)
+
+    for i in range(numeric):
+        values = rng.normal(size=rows)
+        data[f'num_{i}'] = values
+        target += rng.normal() * values if i % 3 else np.sin(values)
+
+    for i in range(categorical):
+        codes = rng.zipf(1.5, size=rows) % cardinality
+        data[f'cat_{i}'] = pd.Categorical.from_codes(codes, [f'c{j}' for j in range(cardinality)]).astype(str)
+        target += rng.normal(size=cardinality)[codes]
+
+    start = pd.Timestamp('2020-01-01')
+    for i in range(datetimes):
+        offsets = rng.integers(0, 3 * 365 * 24, size=rows)
+        data[f'date_{i}'] = start + pd.to_timedelta(offsets, unit='h')
+        target += np.cos(2 * np.pi * data[f'date_{i}'].dayofyear / 365)
+
+    df = pd.DataFrame(data)
+    df[TARGET] = target + rng.normal(scale=0.1, size=rows)
+
+    # Some missing values for the imputers
+    for column in list(data)[:3]:
+        df.loc[rng.random(rows) < 0.02, column] = None
+    return df
+
+class Recorder(RunLog):
+    """Run log of the stages of one case, printed as they finish."""
+
+    def __init__(self):
+        super().__init__(interval=0.01)
+
+    @contextmanager
+    def stage(self, name, **info):
+        with self.span(name, **info) as info:
+            yield info
+        print(f"  {name:<12} {self.spans[-1]['seconds']:9.2f}s")
+
+    @property
+    def stages(self):
+        return {record.pop('name'): record for record in map(dict, self.spans)}
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _post(url, body, content_type, accept=None):
+    request = urllib.request.Request(url, data=body, method='POST', headers={'Content-Type': content_type})
+    if accept:
+        request.add_header('Accept', accept)
+    with urllib.request.urlopen(request, timeout=300) as response:
+        return response.read()
+
+@contextmanager
+def serve(api_name, port):
+    """Run the generated API in a subprocess until it answers."""
+    env = dict(os.environ, CACHE_SIZE='0')
+    process = subprocess.Popen([sys.executable, f'{api_name}.py'], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/docs', timeout=1).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError('API did not start')
+                time.sleep(0.2)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        process.wait()
+
+def run_case(name, spec, stages, workdir, requests=200, batch_rows=10_000, tune_trials=20):
+    """Run the selected ``stages`` on the dataset ``spec``; returns the stage records."""
+    from core import performance, selection, training, tuning
+    from core.cache import FitCache, SetupCache
+    from core.data import fingerprint, read_parquet
+    from core.domains import column_domain
+
+    recorder = Recorder()
+    workdir.mkdir(parents=True, exist_ok=True)
+    print(f'{name}: {spec}')
+
+    df = generate(**spec)
+    source = workdir / f'{name}.parquet'
+    df.to_parquet(source, index=False)
+
+    if 'load' in stages:
+        with recorder.stage('load', rows=len(df), columns=df.shape[1]) as info:
+            loaded, report = read_parquet(str(source))
+            info['memory_mb'] = round(report['after'] / 1024**2, 1)
+        df = loaded
+
+    if not set(stages) - {'load', 'preview'}:
+        model = None
+    else:
+        with recorder.stage('setup'):
+            # Own transformer cache, so every run measures a cold setup
+            regression = training.experiment(df, TARGET, memory=workdir / 'pipeline')
+            setup = SetupCache(root=workdir / 'setup').store(
+                fingerprint(df), regression, regression.pull())
+
+        best_model_name, model = 'lr', None
+        if 'compare' in stages:
+            with recorder.stage('compare') as info:
+                best_model_name, leaderboard, _, model = selection.successive_halving(regression, 'RMSE')
+                info.update(candidates=len(leaderboard), model=best_model_name)
+        if model is None:
+            # Own fit cache, so runs time fits and leave the app's cache alone
+            model, _ = training.fit(regression, best_model_name, setup.key, cache=FitCache(root=workdir / 'fits'))
+
+        if 'tune' in stages:
+            with recorder.stage('tune', trials=tune_trials) as info:
+                matrices = setup.matrices()
+                candidate, trials = tuning.tune(
+                    regression, model, best_model_name, matrices['X_train'], matrices['y_train'],
+                    optimize='RMSE', n_trials=tune_trials)
+                info['pruned'] = 0 if trials is None else int((trials['state'] == 'PRUNED').sum())
+
+        if 'plots' in stages:
+            performance.PLOT_CACHE = workdir / 'plots'
+            with recorder.stage('plots'):
+                performance.generate_performance(
+                    regression, model, setup.matrices(), setup.columns, setup.key, workdir / 'out')
+
+    if 'preview' in stages:
+        with recorder.stage('preview', columns=df.shape[1] - 1):
+            for column in df.columns.drop(TARGET):
+                column_domain(df[column])
+
+    if model is not None and {'api_single', 'api_batch'} & set(stages):
+        from core.deployment import create_api
+
+        port = _free_port()
+        api_name = str((workdir / 'api').resolve())
+        create_api(regression, model, api_name, port=port)
+        X = df.drop(columns=TARGET)
+
+        with serve(api_name, port) as url:
+            if 'api_single' in stages:
+                rows = X.sample(requests, replace=len(X) < requests, random_state=0)
+                bodies = [json.dumps(row, default=str).encode() for row in rows.to_dict('records')]
+                _post(f'{url}/predict', bodies[0], 'application/json')
+
+                latencies = []
+                with recorder.stage('api_single', requests=requests) as info:
+                    for body in bodies:
+                        started = time.perf_counter()
+                        _post(f'{url}/predict', body, 'application/json')
+                        latencies.append(time.perf_counter() - started)
+                    info['p50_ms'] = round(float(np.percentile(latencies, 50)) * 1000, 2)
+                    info['p95_ms'] = round(float(np.percentile(latencies, 95)) * 1000, 2)
+
+            if 'api_batch' in stages:
+                buffer = io.BytesIO()
+                X.sample(batch_rows, replace=len(X) < batch_rows, random_state=0).to_parquet(buffer, index=False)
+
+                with recorder.stage('api_batch', rows=batch_rows):
+                    _post(f'{url}/predict/batch', buffer.getvalue(), 'application/vnd.apache.parquet')
+                record = recorder.spans[-1]
+                record['rows_per_second'] = round(batch_rows / max(record['seconds'], 1e-9))
+
+    return recorder.stages
+
+def startup_imports(runs=3):
+    """Best cold import time of the startup modules and heavy modules they pull in."""
+    code = IMPORT_CHECK.format(src=str(Path(__file__).parent), modules=STARTUP_IMPORTS, heavy=HEAVY_IMPORTS)
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    best = min(results, key=lambda result: result['seconds'])
+    return {'seconds': round(best['seconds'], 3), 'heavy': best['heavy']}
+
+def environment():
+    versions = {}
+    for package in ('pycaret', 'sklearn', 'pandas', 'numpy', 'pyarrow', 'lightgbm', 'xgboost', 'catboost', 'optuna'):
+        try:
+            versions[package] = __import__(package).__version__
+        except Exception:
+            versions[package] = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'packages': versions,
+    }
+
+def compare(results, baseline, tolerance):
+    """Stages slower than ``tolerance`` times the baseline, printed as a table."""
+    regressions = []
+    print(f"\n{'case':<18}{'stage':<13}{'baseline':>10}{'now':>10}{'ratio':>8}")
+    for case, stages in results['cases'].items():
+        for stage, record in stages.items():
+            before = baseline.get('cases', {}).get(case, {}).get(stage)
+            if not before:
+                continue
+            ratio = record['seconds'] / max(before['seconds'], 1e-9)
+            flag = ' !' if ratio > tolerance else ''
+            print(f"{case:<18}{stage:<13}{before['seconds']:>9.2f}s{record['seconds']:>9.2f}s{ratio:>7.2f}x{flag}")
+            if ratio > tolerance:
+                regressions.append((case, stage, ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--case', action='append', choices=CASES, help='cases to run (default: all)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--rows', type=int, help='override the rows of every case')
+    parser.add_argument('--requests', type=int, default=200, help='single-row API requests')
+    parser.add_argument('--batch-rows', type=int, default=10_000)
+    parser.add_argument('--tune-trials', type=int, default=20)
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--imports-only', action='store_true', help='only check the startup imports')
+    parser.add_argument('--import-budget', type=float, default=3.0, help='seconds allowed for the startup imports')
+    parser.add_argument('--tolerance', type=float, default=1.2, help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    load_dotenv()
+    np.random.seed(int(os.environ.get('RANDOM_SEED', 42)))
+
+    results = {'created': dt.datetime.now().isoformat(), 'environment': environment(), 'cases': {}}
+
+    results['imports'] = imports = startup_imports()
+    print(f"startup imports: {imports['seconds']:.2f}s (budget {args.import_budget:.2f}s)")
+    failures = []
+    if imports['seconds'] > args.import_budget:
+        failures.append(f"Startup imports take {imports['seconds']:.2f}s, budget is {args.import_budget:.2f}s")
+    if imports['heavy']:
+        failures.append(f"Startup imports load {', '.join(imports['heavy'])}")
+
+    workdir = Path(tempfile.mkdtemp(prefix='autods-benchmark-'))
+    try:
+        for name in [] if args.imports_only else args.case or CASES:
+            spec = dict(CASES[name], **({'rows': args.rows} if args.rows else {}))
+            results['cases'][name] = run_case(
+                name, spec, args.stages, workdir / name,
+                requests=args.requests, batch_rows=args.batch_rows, tune_trials=args.tune_trials)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    output = RESULTS_DIR / f"{dt.datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'\nResults written to {output}')
+
+    regressions = []
+    if args.baseline.exists():
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    if args.save_baseline:
+        shutil.copyfile(output, args.baseline)
+        print(f'Saved as baseline {args.baseline}')
+
+    if regressions and not args.save_baseline:
+        failures.append(f'{len(regressions)} stage(s) slower than {args.tolerance}x the baseline')
+
+    if failures:
+        print('\n' + '\n'.join(failures))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Non-UI building blocks shared by the Streamlit pages."""
@@ -0,0 +1,130 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import uuid
+import zipfile
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from core.cache import CACHE_DIR
+
+BUILD_DIR = CACHE_DIR / 'builds'
+
+# Modules generating the deployment files, a change in any of them is a new template version
+TEMPLATE_MODULES = ('deployment.py', 'compiler.py', 'runtime.py', 'explain.py')
+
+def template_version():
+    h = hashlib.sha256()
+    for name in TEMPLATE_MODULES:
+        h.update((Path(__file__).parent / name).read_bytes())
+    return h.hexdigest()[:16]
+
+class BuildStore:
+    """Deployment builds addressed by the hash of their inputs.
+
+    A build runs once per key in a background thread and writes to a
+    temporary directory that is renamed into place when it is complete, so
+    sessions never see partial builds or overwrite each other's files.
+    Sessions asking for the same key while it runs share that build. The
+    ``max_builds`` most recently used builds are kept.
+    """
+
+    def __init__(self, root=BUILD_DIR, max_builds=None, workers=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_builds = max_builds or int(os.environ.get('DEPLOYMENT_BUILDS', 5))
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or int(os.environ.get('DEPLOYMENT_BUILD_WORKERS', 1)),
+            thread_name_prefix='build')
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(**inputs):
+        """Key of a build of ``inputs`` with the current template version."""
+        inputs = dict(inputs, template=template_version())
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    def path(self, key):
+        return self.root / key
+
+    def manifest(self, key):
+        """What the finished build of ``key`` contains, ``None`` if there is none."""
+        try:
+            with open(self.path(key) / 'build.json', 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def status(self, key):
+        """``(state, info)``: ``done`` with the manifest, ``running``, ``failed`` with the error or ``missing``."""
+        manifest = self.manifest(key)
+        if manifest is not None:
+            return 'done', manifest
+
+        with self._lock:
+            future = self._futures.get(key)
+        if future is None:
+            return 'missing', None
+        if not future.done():
+            return 'running', None
+        error = future.exception()
+        if error is None:
+            # Built and pruned since
+            self.forget(key)
+            return 'missing', None
+        return 'failed', f'{type(error).__name__}: {error}'
+
+    def submit(self, key, build):
+        """Run ``build(directory)`` for ``key`` unless it is built or building."""
+        with self._lock:
+            if key not in self._futures and self.manifest(key) is None:
+                self._futures[key] = self._executor.submit(self._run, key, build)
+
+    def forget(self, key):
+        """Drop a failed build so the next ``submit`` runs it again."""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and future.done():
+                del self._futures[key]
+
+    def _run(self, key, build):
+        tmp = self.root / f'.{key}.{uuid.uuid4().hex[:8]}'
+        tmp.mkdir()
+        try:
+            manifest = dict(build(tmp) or {}, key=key)
+            manifest['files'] = sorted(str(p.relative_to(tmp)) for p in tmp.rglob('*') if p.is_file())
+            with open(tmp / 'build.json', 'w') as f:
+                json.dump(manifest, f, default=str)
+            try:
+                os.replace(tmp, self.path(key))
+            except OSError:
+                # Built by another process meanwhile
+                pass
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.prune()
+        return manifest
+
+    def archive(self, key):
+        """Zip of the files of a finished build, created in memory."""
+        path = self.path(key)
+        path.touch()
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as f:
+            for name in self.manifest(key)['files']:
+                f.write(path / name, name)
+        return buffer.getvalue()
+
+    def prune(self):
+        """Delete the least recently used builds beyond ``max_builds``."""
+        builds = [p for p in self.root.iterdir() if p.is_dir() and not p.name.startswith('.')]
+        builds.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in builds[self.max_builds:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+build_store = BuildStore()
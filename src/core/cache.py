@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+from core.data import fingerprint
+
+CACHE_DIR = Path('./src/_static/cache')
+
+MATRICES = ['X_train', 'y_train', 'X_test', 'y_test']
+
+class CachedSetup:
+    """Fitted setup restored from the cache directory ``path``."""
+
+    def __init__(self, path, experiment, overview):
+        self.path = Path(path)
+        self.key = self.path.name
+        self.experiment = experiment
+        self.overview = overview
+
+    @property
+    def columns(self):
+        with open(self.path / 'columns.json', 'r') as f:
+            return json.load(f)
+
+    def matrices(self, mmap_mode='r'):
+        """Transformed train/test arrays, memory-mapped from disk by default."""
+        return {name: np.load(self.path / f'{name}.npy', mmap_mode=mmap_mode) for name in MATRICES}
+
+class SetupCache:
+    """Content-addressed cache of ``RegressionExperiment.setup()`` results.
+
+    Entries are keyed by the dataframe fingerprint and the setup arguments and
+    hold the experiment (with its fitted preprocessing pipeline), the setup
+    overview and the transformed train/test matrices as ``.npy`` files.
+    """
+
+    def __init__(self, root=CACHE_DIR / 'setup', max_entries=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries or int(os.environ.get('SETUP_CACHE_SIZE', 5))
+
+    def key(self, df, params):
+        import pycaret
+
+        h = hashlib.sha256()
+        h.update(fingerprint(df).encode())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        h.update(pycaret.__version__.encode())
+        return h.hexdigest()[:16]
+
+    def load(self, key, df):
+        from pycaret.regression import load_experiment
+
+        path = self.root / key
+        if not (path / 'complete').exists():
+            return None
+
+        try:
+            experiment = load_experiment(str(path / 'experiment.pkl'), data=df, preprocess_data=False)
+            overview = joblib.load(path / 'overview.pkl')
+        except Exception:
+            # Stale or incompatible entry, fall back to a fresh setup
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+
+        (path / 'complete').touch()
+        return CachedSetup(path, experiment, overview)
+
+    def store(self, key, experiment, overview):
+        path = self.root / key
+        tmp = self.root / f'.{key}.{uuid.uuid4().hex[:8]}'
+        tmp.mkdir(parents=True)
+
+        experiment.save_experiment(str(tmp / 'experiment.pkl'))
+        joblib.dump(overview, tmp / 'overview.pkl')
+
+        X_train = experiment.get_config('X_train_transformed')
+        with open(tmp / 'columns.json', 'w') as f:
+            json.dump([str(c) for c in X_train.columns], f)
+
+        for name in MATRICES:
+            values = X_train if name == 'X_train' else experiment.get_config(f'{name}_transformed')
+            np.save(tmp / f'{name}.npy', np.ascontiguousarray(values.to_numpy()))
+
+        (tmp / 'complete').touch()
+
+        # Another process may have stored the same setup meanwhile
+        if path.exists():
+            shutil.rmtree(tmp, ignore_errors=True)
+        else:
+            os.replace(tmp, path)
+
+        self.prune()
+        return CachedSetup(path, experiment, overview)
+
+    def prune(self):
+        """Drop least recently used entries beyond ``max_entries``."""
+        entries = [p for p in self.root.iterdir() if (p / 'complete').exists()]
+        entries.sort(key=lambda p: (p / 'complete').stat().st_mtime, reverse=True)
+        for path in entries[self.max_entries:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+class FitCache:
+    """Content-addressed cache of fitted estimators and their CV scores.
+
+    Entries are keyed by the estimator (model id, or class and
+    hyperparameters), the setup cache key (data fingerprint and setup
+    arguments) and the fold specification, so every stage of every job
+    reuses a fit instead of training the same configuration again.
+    """
+
+    def __init__(self, root=CACHE_DIR / 'fits', max_entries=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries or int(os.environ.get('FIT_CACHE_SIZE', 50))
+
+    def key(self, estimator, dataset, fold):
+        if isinstance(estimator, str):
+            spec = ('id', estimator)
+        else:
+            kind = type(estimator)
+            spec = (f'{kind.__module__}.{kind.__qualname__}', estimator.get_params())
+        return joblib.hash((spec, dataset, fold))
+
+    def load(self, key):
+        path = self.root / f'{key}.pkl'
+        try:
+            entry = joblib.load(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            path.unlink(missing_ok=True)
+            return None
+
+        path.touch()
+        return entry['model'], entry['results']
+
+    def store(self, key, model, results):
+        tmp = self.root / f'.{key}.{uuid.uuid4().hex[:8]}'
+        joblib.dump({'model': model, 'results': results}, tmp)
+        os.replace(tmp, self.root / f'{key}.pkl')
+        self.prune()
+
+    def prune(self):
+        """Drop least recently used entries beyond ``max_entries``."""
+        entries = sorted(self.root.glob('*.pkl'), key=lambda p: p.stat().st_mtime, reverse=True)
+        for path in entries[self.max_entries:]:
+            path.unlink(missing_ok=True)
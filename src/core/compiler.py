@@ -0,0 +1,147 @@
+import json
+import shutil
+
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from core.runtime import CompiledModel
+
+# Steps PyCaret only applies while fitting
+TRAIN_ONLY = ('remove_outliers', 'placeholder')
+
+CLEAN_PATTERN = r'[\]\[\,\{\}\"\:]+'
+
+class NotCompilable(Exception):
+    pass
+
+def _columns(step):
+    columns = getattr(step, '_include', None) or getattr(step, 'include', None)
+    if columns is None and hasattr(step.transformer, 'feature_names_in_'):
+        columns = step.transformer.feature_names_in_
+    return [str(column) for column in columns or []]
+
+def _compile_step(name, step):
+    transformer = getattr(step, 'transformer', step)
+    kind = type(transformer).__name__
+
+    if kind == 'ExtractDateTimeFeatures':
+        return {'type': 'date_features', 'columns': _columns(step), 'features': list(transformer.features)}
+
+    if kind == 'SimpleImputer':
+        values = [v.item() if isinstance(v, np.generic) else v for v in transformer.statistics_]
+        return {'type': 'impute', 'values': dict(zip(map(str, transformer.feature_names_in_), values))}
+
+    if kind == 'OrdinalEncoder' and hasattr(transformer, 'mapping'):
+        mapping = {}
+        for entry in transformer.mapping:
+            codes = entry['mapping']
+            mapping[str(entry['col'])] = {str(k): float(v) for k, v in codes.items() if not pd.isna(k)}
+        return {'type': 'ordinal', 'mapping': mapping}
+
+    if kind == 'OneHotEncoder' and hasattr(transformer, 'ordinal_encoder'):
+        mapping = {}
+        for entry in transformer.ordinal_encoder.mapping:
+            column = str(entry['col'])
+            categories = [str(k) for k in entry['mapping'].index if not pd.isna(k)]
+            mapping[column] = (categories, [f'{column}_{category}' for category in categories])
+        return {'type': 'onehot', 'mapping': mapping}
+
+    if kind == 'TargetEncoder' and hasattr(transformer, 'ordinal_encoder'):
+        mapping = {}
+        for entry in transformer.ordinal_encoder.mapping:
+            values = transformer.mapping[entry['col']]
+            codes = {str(k): float(values[v]) for k, v in entry['mapping'].items() if not pd.isna(k) and v in values.index}
+            # Unseen categories get the prior, like handle_unknown='value'
+            mapping[str(entry['col'])] = (codes, float(transformer._mean))
+        return {'type': 'target', 'mapping': mapping}
+
+    if kind == 'StandardScaler':
+        return {
+            'type': 'scale',
+            'columns': [str(c) for c in transformer.feature_names_in_],
+            'mean': transformer.mean_.tolist(),
+            'scale': transformer.scale_.tolist(),
+        }
+
+    if kind == 'CleanColumnNames':
+        return {'type': 'clean_names', 'pattern': CLEAN_PATTERN}
+
+    raise NotCompilable(f"Step '{name}' ({kind}) has no pipeline-free equivalent.")
+
+def _save_estimator(estimator, path):
+    kind = type(estimator).__name__
+
+    if kind == 'LGBMRegressor':
+        estimator.booster_.save_model(str(path / 'model.txt'))
+        return {'kind': 'lightgbm', 'file': 'model.txt'}
+    if kind == 'XGBRegressor':
+        estimator.get_booster().save_model(str(path / 'model.ubj'))
+        return {'kind': 'xgboost', 'file': 'model.ubj'}
+    if kind == 'CatBoostRegressor':
+        estimator.save_model(str(path / 'model.cbm'), format='cbm')
+        return {'kind': 'catboost', 'file': 'model.cbm'}
+    if type(estimator).__module__.startswith('sklearn.linear_model') and hasattr(estimator, 'coef_'):
+        return {
+            'kind': 'linear',
+            'coef': np.ravel(estimator.coef_).tolist(),
+            'intercept': float(np.ravel(estimator.intercept_)[0]) if np.ndim(estimator.intercept_) else float(estimator.intercept_),
+        }
+
+    joblib.dump(estimator, path / 'model.joblib')
+    return {'kind': 'sklearn', 'file': 'model.joblib'}
+
+def compile_model(pipeline, data, path):
+    """Compile a fitted PyCaret pipeline (with trained model) to ``path``.
+
+    The preprocessing steps become a declarative transform chain executed by
+    ``core.runtime`` with pandas/NumPy, the estimator is stored in its native
+    format. Raises ``NotCompilable`` for steps without an equivalent.
+    """
+    path = Path(path)
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+
+    steps, estimator = pipeline.steps[:-1], pipeline.steps[-1][1]
+    compiled = [_compile_step(name, step) for name, step in steps if name not in TRAIN_ONLY and step not in (None, 'passthrough')]
+
+    sample = data.head(100)
+    outputs = [str(c) for c in pipeline[:-1].transform(sample).columns]
+    inputs = [str(c) for c in data.columns]
+
+    spec = {
+        'inputs': inputs,
+        'datetimes': [c for c in inputs if pd.api.types.is_datetime64_any_dtype(data[c])],
+        'numerics': [c for c in inputs if pd.api.types.is_numeric_dtype(data[c]) and not pd.api.types.is_bool_dtype(data[c])],
+        'steps': compiled,
+        'outputs': outputs,
+        'estimator': _save_estimator(estimator, path),
+    }
+    with open(path / 'model.json', 'w') as f:
+        json.dump(spec, f, default=str)
+
+    return CompiledModel(str(path))
+
+def parity(compiled, model, data, rows=1000, rtol=1e-5, atol=1e-6):
+    """Compare compiled predictions with ``predict_model`` on a data sample."""
+    from pycaret.regression import predict_model
+
+    sample = data.sample(min(rows, len(data)), random_state=0)
+    expected = predict_model(model, data=sample, round=10, verbose=False)['prediction_label'].to_numpy(dtype='float64')
+    actual = compiled.predict(sample)
+
+    difference = np.abs(actual - expected)
+    return {
+        'rows': len(sample),
+        'max_abs_diff': float(difference.max()) if len(difference) else 0.0,
+        'passed': bool(np.allclose(actual, expected, rtol=rtol, atol=atol)),
+    }
+
+def size(path):
+    """Bytes on disk of a file or directory."""
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob('*') if p.is_file())
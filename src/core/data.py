@@ -0,0 +1,126 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Strings with fewer distinct values than this share of rows become categoricals
+CATEGORY_RATIO = 0.5
+
+
+def fingerprint(df):
+    """Content hash of a dataframe (values, index, column names and dtypes)."""
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    return h.hexdigest()[:16]
+
+
+def row_hashes(df):
+    """Content hash of every row (values only), to find rows of one dataset in another."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def parquet_schema(file):
+    """Columns, types and uncompressed sizes of a Parquet file without reading data."""
+    pf = pq.ParquetFile(file)
+    sizes = {name: 0 for name in pf.schema_arrow.names}
+    for i in range(pf.metadata.num_row_groups):
+        row_group = pf.metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            name = column.path_in_schema.split('.')[0]
+            if name in sizes:
+                sizes[name] += column.total_uncompressed_size
+
+    schema = pd.DataFrame({
+        'Column': pf.schema_arrow.names,
+        'Type': [str(field.type) for field in pf.schema_arrow],
+        'Size (MB)': [sizes[name] / 1024**2 for name in pf.schema_arrow.names],
+    })
+    return schema, pf.metadata.num_rows
+
+
+def compact(df):
+    """Downcast numeric columns where lossless."""
+    for column in df.columns:
+        dtype = df[column].dtype
+        if pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        elif pd.api.types.is_float_dtype(dtype) and dtype == np.float64:
+            values = df[column].to_numpy()
+            downcast = values.astype(np.float32)
+            if np.array_equal(downcast.astype(np.float64), values, equal_nan=True):
+                df[column] = downcast
+    return df
+
+
+def read_parquet(file, columns=None):
+    """Read only ``columns`` row group by row group into compact dtypes.
+
+    Low-cardinality strings are dictionary encoded in Arrow and arrive as
+    categoricals without materializing Python strings, numerics are
+    downcast. Returns the dataframe and a memory report in bytes.
+    """
+    pf = pq.ParquetFile(file)
+    schema, rows = parquet_schema(file)
+    columns = columns or pf.schema_arrow.names
+
+    frames, categories = [], None
+    naive, arrow = 0, 0
+    for i in range(pf.num_row_groups):
+        table = pf.read_row_group(i, columns=columns)
+        arrow += table.nbytes
+
+        if categories is None:
+            # Decide on the first row group so every chunk gets the same dtypes
+            categories = [
+                name for name in table.column_names
+                if (pa.types.is_string(table.schema.field(name).type)
+                    or pa.types.is_large_string(table.schema.field(name).type))
+                and table.column(name).unique().length <= CATEGORY_RATIO * max(table.num_rows, 1)
+            ]
+            # Size of the first chunk as plain pandas, extrapolated to all rows
+            naive = table.to_pandas().memory_usage(deep=True).sum() * pf.metadata.num_rows / max(table.num_rows, 1)
+
+        for name in categories:
+            table = table.set_column(
+                table.column_names.index(name), name, table.column(name).dictionary_encode())
+
+        # One block per column, so merging can free every chunk column on its own
+        frames.append(compact(table.to_pandas(split_blocks=True, self_destruct=True)))
+        del table
+
+    df = _concat(frames, columns) if frames else pf.schema_arrow.empty_table().select(columns).to_pandas()
+
+    report = {
+        'rows': rows,
+        'file': int(schema['Size (MB)'].sum() * 1024**2),
+        'arrow': int(arrow),
+        'before': int(naive),
+        'after': int(df.memory_usage(deep=True).sum()),
+    }
+    return df, report
+
+
+def _concat(frames, columns):
+    """Concatenate chunks column by column, dropping each chunk column once merged.
+
+    Peak memory is the result plus one column instead of twice the data.
+    """
+    if len(frames) == 1:
+        return frames[0]
+
+    merged = {}
+    for column in columns:
+        parts = [frame.pop(column) for frame in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            # Concatenating categoricals with different categories would fall
+            # back to object dtype, so their codes are merged separately
+            merged[column] = pd.api.types.union_categoricals(parts)
+        else:
+            merged[column] = pd.concat(parts, ignore_index=True)
+        del parts
+    # Without copying, the columns are not consolidated into new blocks
+    return pd.DataFrame(merged, copy=False)
@@ -0,0 +1,571 @@
+import inspect
+import shutil
+import time
+
+from pathlib import Path
+from string import Template
+
+import numpy as np
+import pandas as pd
+
+MAX_BATCH_ROWS = 1_000_000
+CHUNK_ROWS = 50_000
+
+BATCH_WINDOW_MS = 2
+BATCH_MAX_ROWS = 256
+CACHE_SIZE = 10_000
+CACHE_TTL = 300
+MAX_EXPLAIN_ROWS = 10_000
+
+API_TEMPLATE = Template('''# -*- coding: utf-8 -*-
+
+import asyncio
+import bisect
+import io
+import json
+import os
+import re
+import resource
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import uvicorn
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import create_model
+
+# Largest batch accepted by /predict/batch and rows predicted at once
+MAX_BATCH_ROWS = $max_batch_rows
+CHUNK_ROWS = $chunk_rows
+
+# Concurrent /predict requests arriving within the window are predicted together
+BATCH_WINDOW_MS = float(os.environ.get("BATCH_WINDOW_MS", $batch_window_ms))
+BATCH_MAX_ROWS = int(os.environ.get("BATCH_MAX_ROWS", $batch_max_rows))
+
+# Cache of /predict results, 0 disables it
+CACHE_SIZE = int(os.environ.get("CACHE_SIZE", $cache_size))
+CACHE_TTL = float(os.environ.get("CACHE_TTL", $cache_ttl))
+
+ARROW = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+NDJSON = "application/x-ndjson"
+
+# Upper bounds in seconds of the latency histograms served by /metrics
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Create the app
+app = FastAPI()
+
+_load_started = time.perf_counter()
+
+$predictor
+
+MODEL_LOAD_SECONDS = time.perf_counter() - _load_started
+
+# Create input/output pydantic models
+input_model = create_model("${name}_input", **{$example})
+output_model = create_model("${name}_output", prediction=$prediction)
+
+COLUMNS = list(input_model.__fields__)
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row requests into one vectorized prediction.
+
+    A batch is predicted when ``max_rows`` rows are waiting or ``window``
+    seconds after its first row arrived, whichever comes first.
+    """
+
+    def __init__(self, window, max_rows):
+        self.window, self.max_rows = window, max_rows
+        self.pending, self.timer = [], None
+        # One prediction at a time, so rows pile up into the next batch meanwhile
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def predict(self, row):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((row, future))
+
+        if len(self.pending) >= self.max_rows:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self.run(batch))
+
+    async def run(self, batch):
+        loop = asyncio.get_running_loop()
+        data = pd.DataFrame([row for row, _ in batch])
+        try:
+            predictions = await loop.run_in_executor(
+                self.executor, lambda: predict_frame(data).tolist())
+            stats["predicted_rows"] += len(predictions)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+
+
+class TTLCache:
+    """LRU cache whose entries expire ``ttl`` seconds after they were stored."""
+
+    def __init__(self, size, ttl):
+        self.size, self.ttl = size, ttl
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, value):
+        self.entries[key] = (time.monotonic(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus text format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum, self.count = 0.0, 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f'{name}_bucket{{{labels},le="{le}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+batcher = MicroBatcher(BATCH_WINDOW_MS / 1000, BATCH_MAX_ROWS)
+cache = TTLCache(CACHE_SIZE, CACHE_TTL) if CACHE_SIZE > 0 else None
+
+latencies = {}
+responses = {}
+stats = {"predicted_rows": 0, "batch_seconds": Histogram()}
+
+
+@app.middleware("http")
+async def measure(request: Request, call_next):
+    """Request latency (until the response headers) per endpoint."""
+    started = time.perf_counter()
+    response = await call_next(request)
+    path = request.url.path
+    if path in ("/predict", "/predict/batch", "/explain"):
+        latencies.setdefault(path, Histogram()).observe(time.perf_counter() - started)
+        key = (path, response.status_code)
+        responses[key] = responses.get(key, 0) + 1
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Latency histograms, request counts and model load time (Prometheus format)."""
+    lines = [
+        "# TYPE model_load_seconds gauge",
+        f"model_load_seconds {MODEL_LOAD_SECONDS}",
+        "# TYPE process_peak_rss_bytes gauge",
+        f"process_peak_rss_bytes {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}",
+        "# TYPE request_duration_seconds histogram",
+    ]
+    for path, histogram in latencies.items():
+        lines.extend(histogram.lines("request_duration_seconds", f'path="{path}"'))
+    lines.append("# TYPE requests_total counter")
+    for (path, status), count in responses.items():
+        lines.append(f'requests_total{{path="{path}",status="{status}"}} {count}')
+    lines.append("# TYPE batch_prediction_seconds histogram")
+    lines.extend(stats["batch_seconds"].lines("batch_prediction_seconds", 'path="/predict/batch"'))
+    lines.append("# TYPE predicted_rows_total counter")
+    lines.append(f"predicted_rows_total {stats['predicted_rows']}")
+    return "\\n".join(lines) + "\\n"
+
+
+# Define predict function
+@app.post("/predict", response_model=output_model)
+async def predict(data: input_model):
+    row = data.dict()
+    key = json.dumps(row, sort_keys=True, default=str) if cache is not None else None
+
+    prediction = cache.get(key) if cache is not None else None
+    if prediction is None:
+        prediction = await batcher.predict(row)
+        if cache is not None:
+            cache.put(key, prediction)
+    return {"prediction": prediction}
+
+
+class Sink(io.RawIOBase):
+    """Write-only stream handing out what was written since the last drain."""
+
+    def __init__(self):
+        self.parts, self.position = [], 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def media_type(value):
+    value = (value or "").split(";")[0].strip().lower()
+    if "arrow" in value:
+        return ARROW
+    if "parquet" in value:
+        return PARQUET
+    if "ndjson" in value or "jsonl" in value or "json" in value:
+        return NDJSON
+    return None
+
+
+def read_batch(body, content_type):
+    """Parse the request body into a table (rows are counted before predicting)."""
+    if content_type == ARROW:
+        return pa.ipc.open_stream(body).read_all()
+    if content_type == PARQUET:
+        return pq.read_table(io.BytesIO(body), columns=COLUMNS)
+    return pa.Table.from_pandas(pd.read_json(io.BytesIO(body), lines=True), preserve_index=False)
+
+
+def write_batches(table, accept):
+    """Predict ``table`` chunk by chunk and stream the predictions."""
+    sink, writer = Sink(), None
+    schema = pa.schema([("prediction", pa.float64())])
+    started, rows = time.perf_counter(), 0
+
+    for batch in table.to_batches(max_chunksize=CHUNK_ROWS):
+        data = batch.to_pandas()[COLUMNS]
+        predictions = predict_frame(data).astype("float64")
+        rows += len(predictions)
+
+        if accept == NDJSON:
+            yield "".join(json.dumps({"prediction": value}) + "\\n" for value in predictions.tolist()).encode()
+            continue
+
+        result = pa.Table.from_arrays([pa.array(predictions)], schema=schema)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, schema) if accept == PARQUET else pa.ipc.new_stream(sink, schema)
+        writer.write_table(result)
+        yield sink.drain()
+
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+    elapsed = time.perf_counter() - started
+    stats["predicted_rows"] += rows
+    stats["batch_seconds"].observe(elapsed)
+
+
+# Define batch predict function
+@app.post("/predict/batch")
+async def predict_batch(request: Request):
+    """Predict many rows at once.
+
+    The body is an Arrow IPC stream, a Parquet file or newline delimited JSON
+    (set ``Content-Type`` accordingly) with at most ``MAX_BATCH_ROWS`` rows.
+    Predictions are streamed back in the same format, or in the one requested
+    by ``Accept``, in input order.
+    """
+    content_type = media_type(request.headers.get("content-type"))
+    if content_type is None:
+        raise HTTPException(status_code=415, detail=f"Use {ARROW}, {PARQUET} or {NDJSON}.")
+    accept = media_type(request.headers.get("accept")) or content_type
+
+    try:
+        table = read_batch(await request.body(), content_type)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read batch: {e}")
+
+    if table.num_rows > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ROWS} rows per batch.")
+    missing = [column for column in COLUMNS if column not in table.column_names]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing columns: {', '.join(missing)}")
+
+    return StreamingResponse(write_batches(table, accept), media_type=accept)
+
+
+$explainer
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="$host", port=$port)
+''')
+
+EXPLAINER = Template('''# Batched SHAP explanations (generated from core/explain.py)
+$source
+
+
+MAX_EXPLAIN_ROWS = int(os.environ.get("MAX_EXPLAIN_ROWS", $max_explain_rows))
+
+explain_executor = ThreadPoolExecutor(max_workers=1)
+explainer = None
+
+
+def explain_frame(data):
+    """Predictions with base value and contributions per input column."""
+    global explainer
+    if explainer is None:
+        # Built on the first request, so starting the API does not import shap
+        explainer = Explainer(estimator, transform_frame, pd.read_parquet("$background"), OUTPUTS)
+    contributions = explainer.explain(data)
+    predictions = predict_frame(data).astype("float64")
+    return [
+        {"prediction": prediction, "base_value": row.pop("base_value"), "contributions": row}
+        for prediction, row in zip(predictions.tolist(), contributions.to_dict("records"))
+    ]
+
+
+# Define explain function
+@app.post("/explain")
+async def explain(request: Request):
+    """SHAP explanations of the predictions of one or many rows.
+
+    The body is a JSON object or list of objects, or a batch like for
+    ``/predict/batch`` with at most ``MAX_EXPLAIN_ROWS`` rows. Returns a list
+    with prediction, base value and contribution of every column per row.
+    """
+    body = await request.body()
+    content_type = (request.headers.get("content-type") or "application/json").split(";")[0].strip().lower()
+
+    try:
+        if content_type == "application/json":
+            rows = json.loads(body)
+            data = pd.DataFrame([rows] if isinstance(rows, dict) else rows)
+        else:
+            data = read_batch(body, media_type(content_type)).to_pandas()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read rows: {e}")
+
+    if len(data) > MAX_EXPLAIN_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_EXPLAIN_ROWS} rows per request.")
+    missing = [column for column in COLUMNS if column not in data.columns]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Missing columns: {', '.join(missing)}")
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(explain_executor, explain_frame, data[COLUMNS])
+''')
+
+PIPELINE_PREDICTOR = """from pycaret.regression import load_model, predict_model
+
+# Load trained Pipeline
+model = load_model("$api_name")
+
+
+def predict_frame(data):
+    return predict_model(model, data=data)["prediction_label"].to_numpy()
+
+
+# Estimator and its features for explanations
+estimator = model.steps[-1][1]
+OUTPUTS = None
+
+
+def transform_frame(data):
+    return model[:-1].transform(data)
+"""
+
+COMPILED_PREDICTOR = """# Pipeline-free inference runtime (generated from core/runtime.py)
+$runtime
+
+# Load compiled model
+model = CompiledModel("$artifact")
+
+
+def predict_frame(data):
+    return model.predict(data)
+
+
+# Estimator and its features for explanations
+estimator = model.estimator
+OUTPUTS = model.spec["outputs"]
+transform_frame = model.transform
+"""
+
+DOCKERFILE = Template('''FROM python:3.11-slim
+
+WORKDIR /app
+ADD . /app
+
+RUN apt-get update && apt-get install -y libgomp1 && rm -rf /var/lib/apt/lists/*
+RUN pip install --no-cache-dir -r requirements.txt
+
+EXPOSE $port
+CMD ["python", "$name.py"]
+''')
+
+# Batch endpoint reads Arrow and Parquet, /explain needs shap
+PIPELINE_REQUIREMENTS = ['pycaret', 'fastapi', 'uvicorn', 'pyarrow', 'shap']
+
+RUNTIME_REQUIREMENTS = {
+    kind: ['fastapi', 'uvicorn', 'numpy', 'pandas', 'pyarrow', 'shap'] + extra
+    for kind, extra in {
+        'lightgbm': ['lightgbm'],
+        'xgboost': ['xgboost'],
+        'catboost': ['catboost'],
+        'linear': [],
+        'sklearn': ['scikit-learn', 'joblib'],
+    }.items()
+}
+
+def _literal(value):
+    """Python source for an example value of the input schema."""
+    if isinstance(value, pd.Timestamp):
+        return f"pd.Timestamp({str(value)!r})"
+    if isinstance(value, pd.Timedelta):
+        return f"pd.Timedelta({str(value)!r})"
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return 'float("nan")'
+    if isinstance(value, (bool, int, float, str)) or value is None:
+        return repr(value)
+    return repr(str(value))
+
+def create_api(regression, model, api_name, host='127.0.0.1', port=8000, artifact=None, relative=False):
+    """Save ``model`` and write a FastAPI service for it to ``{api_name}.py``.
+
+    Like PyCaret's ``create_api`` but with proper literals for dates and
+    missing values, micro-batching and caching for ``/predict``, an
+    additional ``/predict/batch`` endpoint, ``/explain`` and ``/metrics``. With
+    ``artifact``, the path of a model compiled by ``core.compiler``, the
+    service serves that instead of the pickled pipeline and does not need
+    PyCaret. With ``relative``, the service loads its model by file name
+    from the directory it is started in instead of by the given paths.
+    """
+    if artifact is None:
+        regression.save_model(model, api_name, verbose=False)
+        predictor = Template(PIPELINE_PREDICTOR).substitute(api_name=Path(api_name).name if relative else api_name)
+    else:
+        from core import runtime
+
+        # Unchanged with its own imports, so the service does not depend on the template's
+        predictor = Template(COMPILED_PREDICTOR).substitute(
+            runtime=inspect.getsource(runtime).strip(), artifact=Path(artifact).name if relative else artifact)
+
+    from core import explain
+
+    X = regression.get_config('X')
+    y = regression.get_config('y')
+    example = ', '.join(f'{str(column)!r}: {_literal(value)}' for column, value in X.iloc[0].items())
+
+    # Reference rows for explaining models without TreeSHAP or a closed form
+    background = f'{api_name}_background.parquet'
+    explain.background(X).to_parquet(background)
+    explainer = EXPLAINER.substitute(
+        source=inspect.getsource(explain).strip(),
+        background=Path(background).name if relative else background,
+        max_explain_rows=f'{MAX_EXPLAIN_ROWS:_}',
+    )
+
+    source = API_TEMPLATE.substitute(
+        name=Path(api_name).name,
+        predictor=predictor,
+        example=example,
+        prediction=_literal(float(y.iloc[0])),
+        max_batch_rows=f'{MAX_BATCH_ROWS:_}',
+        chunk_rows=f'{CHUNK_ROWS:_}',
+        batch_window_ms=BATCH_WINDOW_MS,
+        batch_max_rows=BATCH_MAX_ROWS,
+        cache_size=f'{CACHE_SIZE:_}',
+        cache_ttl=CACHE_TTL,
+        explainer=explainer,
+        host=host,
+        port=port,
+    )
+    with open(f'{api_name}.py', 'w') as file:
+        file.write(source)
+
+def create_docker(path, name, port=8000, requirements=PIPELINE_REQUIREMENTS):
+    """Write ``Dockerfile`` and ``requirements.txt`` for the service ``name`` to ``path``."""
+    path = Path(path)
+    (path / 'Dockerfile').write_text(DOCKERFILE.substitute(name=name, port=port))
+    (path / 'requirements.txt').write_text('\n'.join(requirements) + '\n')
+
+def build_deployment(path, regression, model, features, name, host='127.0.0.1', port=8000, mode='pipeline'):
+    """Write service, model and Docker files of a deployment to ``path``.
+
+    With ``mode='compiled'`` the model is compiled (see ``core.compiler``)
+    and served without PyCaret if it predicts like the pipeline on
+    ``features``, otherwise the pipeline is served. Returns what was built.
+    """
+    from core import compiler
+
+    path = Path(path)
+    built = {'mode': 'pipeline', 'parity': None, 'error': None}
+
+    if mode == 'compiled':
+        artifact = path / f'{name}_compiled'
+        try:
+            compiled = compiler.compile_model(model, features, artifact)
+            built['parity'] = compiler.parity(compiled, model, features)
+        except compiler.NotCompilable as e:
+            built['error'] = str(e)
+        else:
+            if built['parity']['passed']:
+                built.update(mode='compiled', size=compiler.size(artifact))
+
+        if built['mode'] == 'compiled':
+            create_api(regression, model, str(path / name), host=host, port=port, artifact=str(artifact), relative=True)
+            create_docker(path, name, port, RUNTIME_REQUIREMENTS[compiled.spec['estimator']['kind']])
+            return built
+        shutil.rmtree(artifact, ignore_errors=True)
+
+    create_api(regression, model, str(path / name), host=host, port=port, relative=True)
+    create_docker(path, name, port)
+    return built
+
+def throughput(model, df, rows=10_000):
+    """Rows per second of ``predict_model`` for a batch of ``rows`` rows."""
+    from pycaret.regression import predict_model
+
+    batch = df.sample(min(rows, len(df)), replace=len(df) < rows, random_state=0)
+    predict_model(model, data=batch.head(10), verbose=False)
+    started = time.perf_counter()
+    predict_model(model, data=batch, verbose=False)
+    return len(batch), len(batch) / (time.perf_counter() - started)
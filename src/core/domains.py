@@ -0,0 +1,67 @@
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Columns with more distinct values only offer the most frequent ones
+TOP_K = 1000
+MAX_DATASETS = 8
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+def column_domain(series):
+    """Kind, range and sorted (top-K) values of a column for form inputs."""
+    values = series.dropna()
+    domain = {'dtype': str(series.dtype), 'distinct': int(values.nunique())}
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        domain['kind'] = 'datetime'
+    elif pd.api.types.is_bool_dtype(series) or (pd.api.types.is_numeric_dtype(series) and domain['distinct'] == 2):
+        domain['kind'] = 'boolean'
+    elif pd.api.types.is_numeric_dtype(series):
+        domain['kind'] = 'numeric'
+    else:
+        domain['kind'] = 'categorical'
+
+    if domain['kind'] == 'categorical':
+        if domain['distinct'] > TOP_K:
+            items = values.value_counts().index[:TOP_K]
+        else:
+            items = values.unique()
+        items = pd.Index(items)
+        try:
+            items = items.sort_values()
+        except TypeError:
+            items = items[np.argsort(items.astype(str))]
+        items = items.to_numpy(dtype=object)
+        domain['values'] = items
+        domain['positions'] = {value: position for position, value in enumerate(items)}
+        domain['truncated'] = domain['distinct'] > TOP_K
+    elif len(values):
+        domain['min'], domain['max'] = values.min(), values.max()
+    else:
+        domain['min'] = domain['max'] = None
+
+    return domain
+
+def domain_index(df, dataset):
+    """Per-column domains of ``df``, built once per dataset fingerprint.
+
+    The index is kept process-wide for the ``MAX_DATASETS`` most recently
+    used datasets, so every session and rerun reuses it.
+    """
+    with _lock:
+        if dataset in _indexes:
+            _indexes.move_to_end(dataset)
+            return _indexes[dataset]
+
+    index = {column: column_domain(df[column]) for column in df.columns}
+
+    with _lock:
+        _indexes[dataset] = index
+        while len(_indexes) > MAX_DATASETS:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+BINS = 30
+TOP_K = 20
+
+def overview(df):
+    """Cheap per-column summary for all columns."""
+    missing = df.isna().sum()
+    return pd.DataFrame({
+        'Column': df.columns,
+        'Type': [str(t) for t in df.dtypes],
+        'Missing': missing.to_numpy(),
+        'Missing %': (missing / max(len(df), 1) * 100).round(2).to_numpy(),
+    })
+
+def column_stats(series):
+    """Vectorized statistics and a pre-binned distribution of one column.
+
+    Returns the kind of the column (``numeric``, ``datetime`` or
+    ``categorical``), the statistics as series and the distribution as
+    dataframe with ``value`` and ``count`` columns.
+    """
+    rows = len(series)
+    values = series.dropna()
+    stats = {
+        'Count': len(values),
+        'Missing': rows - len(values),
+        'Missing %': round((rows - len(values)) / max(rows, 1) * 100, 2),
+        'Distinct': values.nunique(),
+    }
+
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        kind = 'numeric'
+        arr = values.to_numpy(dtype=np.float64)
+        if len(arr):
+            q = np.quantile(arr, [0, 0.25, 0.5, 0.75, 1])
+            mean, std = arr.mean(), arr.std(ddof=1) if len(arr) > 1 else 0.0
+            stats.update({
+                'Mean': mean,
+                'Std': std,
+                'Min': q[0],
+                '25%': q[1],
+                'Median': q[2],
+                '75%': q[3],
+                'Max': q[4],
+                'Zeros': int((arr == 0).sum()),
+                'Skewness': float(((arr - mean) ** 3).mean() / std ** 3) if std else 0.0,
+            })
+        counts, edges = np.histogram(arr, bins=BINS) if len(arr) else (np.array([]), np.array([0]))
+        distribution = pd.DataFrame({'value': (edges[:-1] + edges[1:]) / 2, 'count': counts})
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        kind = 'datetime'
+        ints = values.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        if len(ints):
+            stats.update({'Min': values.min(), 'Max': values.max()})
+        counts, edges = np.histogram(ints, bins=BINS) if len(ints) else (np.array([]), np.array([0]))
+        distribution = pd.DataFrame({
+            'value': pd.to_datetime(((edges[:-1] + edges[1:]) / 2).astype(np.int64)),
+            'count': counts,
+        })
+    else:
+        kind = 'categorical'
+        counts = values.value_counts()
+        top = counts.head(TOP_K)
+        stats.update({
+            'Most frequent': top.index[0] if len(top) else None,
+            'Top %': round(top.iloc[0] / max(len(values), 1) * 100, 2) if len(top) else None,
+        })
+        distribution = pd.DataFrame({'value': top.index.astype(str), 'count': top.to_numpy()})
+        if len(counts) > TOP_K:
+            other = pd.DataFrame({'value': ['(other)'], 'count': [counts.iloc[TOP_K:].sum()]})
+            distribution = pd.concat([distribution, other], ignore_index=True)
+
+    return kind, pd.Series(stats, dtype=object), distribution
@@ -0,0 +1,79 @@
+import os
+
+import pandas as pd
+
+# One-hot columns the encoded matrix may gain in total, and levels per column
+OHE_BUDGET = 200
+MAX_OHE_LEVELS = 25
+HASH_COMPONENTS = 32
+
+def categorical_cardinality(df, target):
+    """Distinct values of the categorical feature columns."""
+    columns = [
+        column for column in df.columns
+        if column != target
+        and not pd.api.types.is_numeric_dtype(df[column])
+        and not pd.api.types.is_bool_dtype(df[column])
+        and not pd.api.types.is_datetime64_any_dtype(df[column])
+    ]
+    return {column: int(df[column].nunique()) for column in columns}
+
+def plan(df, target, budget=None, max_levels=None):
+    """Encoding of every categorical column: ``ordinal``, ``onehot`` or ``high``.
+
+    Columns are one-hot encoded up to the highest cardinality (at most
+    ``max_levels``) for which all one-hot columns together stay within
+    ``budget``; the rest get the high-cardinality encoding. Binary columns
+    are always encoded ordinally by PyCaret.
+    """
+    budget = budget or int(os.environ.get('ENCODING_OHE_BUDGET', OHE_BUDGET))
+    max_levels = max_levels or int(os.environ.get('ENCODING_MAX_LEVELS', MAX_OHE_LEVELS))
+    cardinality = categorical_cardinality(df, target)
+
+    # PyCaret one-hot encodes up to a single cardinality threshold
+    threshold = 2
+    for levels in sorted(set(cardinality.values())):
+        if levels > max_levels or sum(n for n in cardinality.values() if 2 < n <= levels) > budget:
+            break
+        threshold = max(threshold, levels)
+
+    methods = {
+        column: 'ordinal' if levels <= 2 else 'onehot' if levels <= threshold else 'high'
+        for column, levels in cardinality.items()
+    }
+    return methods, threshold
+
+def encoding_params(df, target):
+    """``setup()`` arguments for a memory-aware categorical encoding.
+
+    High-cardinality columns are target encoded (``ENCODING_METHOD=target``,
+    PyCaret's default encoder) or hashed into a fixed number of columns
+    (``hashing``) instead of one-hot encoded into one dense float column per
+    level.
+    """
+    methods, threshold = plan(df, target)
+    params = {'max_encoding_ohe': threshold}
+
+    if 'high' in methods.values() and os.environ.get('ENCODING_METHOD', 'target').lower() == 'hashing':
+        from category_encoders import HashingEncoder
+
+        params['encoding_method'] = HashingEncoder(
+            n_components=int(os.environ.get('ENCODING_HASH_COMPONENTS', HASH_COMPONENTS)))
+    return params
+
+def matrix_report(regression, df, target):
+    """Overview rows on the size of the encoded matrix against the raw data."""
+    methods, _ = plan(df, target)
+    raw = df.drop(columns=target).memory_usage(deep=True).sum()
+    X_train = regression.get_config('X_train_transformed')
+    X_test = regression.get_config('X_test_transformed')
+    encoded = X_train.memory_usage(deep=True).sum() + X_test.memory_usage(deep=True).sum()
+
+    rows = [
+        ('One-hot encoded columns', sum(m == 'onehot' for m in methods.values())),
+        ('High-cardinality encoded columns', sum(m == 'high' for m in methods.values())),
+        ('Raw features (MB)', round(raw / 1024**2, 2)),
+        ('Encoded matrix (MB)', round(encoded / 1024**2, 2)),
+        ('Encoding expansion', f'{encoded / max(raw, 1):.1f}x'),
+    ]
+    return pd.DataFrame(rows, columns=['Description', 'Value'])
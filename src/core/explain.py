@@ -0,0 +1,84 @@
+"""Batched SHAP explanations of regression models.
+
+Only needs NumPy, pandas and shap, so this module is also copied verbatim
+into generated APIs.
+"""
+
+import numpy as np
+import pandas as pd
+
+BACKGROUND_ROWS = 100
+BATCH_ROWS = 5_000
+
+
+def background(data, rows=BACKGROUND_ROWS, seed=0):
+    """Fixed random sample of ``data`` as reference for model-agnostic explanations."""
+    return data.sample(min(rows, len(data)), random_state=seed)
+
+
+def feature_groups(outputs, inputs):
+    """Input column of every model feature (one-hot and date parts belong to their source)."""
+    groups = []
+    for output in outputs:
+        matches = [column for column in inputs if output == column or output.startswith(f'{column}_')]
+        groups.append(max(matches, key=len) if matches else output)
+    return groups
+
+
+def _explainer(shap, estimator, reference):
+    """SHAP explainer of ``estimator``, call options and method name."""
+    try:
+        return shap.TreeExplainer(estimator), {'check_additivity': False}, 'tree'
+    except Exception:
+        pass
+    try:
+        return shap.LinearExplainer(estimator, reference), {}, 'linear'
+    except Exception:
+        pass
+    masker = shap.maskers.Independent(reference, max_samples=len(reference))
+    options = {'max_evals': 2 * reference.shape[1] + 1, 'silent': True}
+    return shap.explainers.Permutation(estimator.predict, masker), options, 'permutation'
+
+
+class Explainer:
+    """SHAP values of a model on its features, summed per input column.
+
+    Tree ensembles get exact TreeSHAP, which needs no reference data,
+    linear models the closed form against the ``background`` mean. Other
+    models fall back to the permutation explainer with the fewest
+    evaluations over the (small) ``background`` sample. Rows are explained
+    in vectorized batches of ``BATCH_ROWS``.
+
+    ``transform`` maps input rows to the model features (``outputs``, by
+    default the columns it returns) and ``estimator`` predicts on them.
+    """
+
+    def __init__(self, estimator, transform, background, outputs=None):
+        import shap
+
+        features = transform(background)
+        outputs = outputs if outputs is not None else [str(c) for c in features.columns]
+        reference = np.asarray(features, dtype='float64')
+
+        self.transform = transform
+        self.groups = feature_groups(outputs, [str(c) for c in background.columns])
+        self.explainer, self.options, self.method = _explainer(shap, estimator, reference)
+
+    def explain(self, data, batch_rows=BATCH_ROWS):
+        """Base value and contribution of every input column for each row of ``data``."""
+        values, bases = [], []
+        for start in range(0, len(data), batch_rows):
+            X = np.asarray(self.transform(data.iloc[start:start + batch_rows]), dtype='float64')
+            explanation = self.explainer(X, **self.options)
+            values.append(np.asarray(explanation.values, dtype='float64').reshape(len(X), -1))
+            base = np.ravel(np.asarray(explanation.base_values, dtype='float64'))
+            bases.append(np.full(len(X), base[0]) if base.size == 1 else base)
+
+        if not values:
+            return pd.DataFrame(columns=['base_value', *dict.fromkeys(self.groups)], index=data.index)
+
+        contributions = pd.DataFrame(np.vstack(values), columns=self.groups)
+        contributions = contributions.T.groupby(level=0, sort=False).sum().T
+        contributions.insert(0, 'base_value', np.concatenate(bases))
+        contributions.index = data.index
+        return contributions
@@ -0,0 +1,140 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+PAGE_SIZE = 100
+BINS = 50
+# Columns with more distinct values are filtered by substring instead of a value list
+MAX_CHOICES = 200
+TOP_K = 30
+
+def kind(field):
+    """How a column of an Arrow schema is filtered: ``range``, ``in`` or ``contains``."""
+    type_ = field.type
+    if pa.types.is_integer(type_) or pa.types.is_floating(type_) or _temporal(type_):
+        return 'range'
+    if pa.types.is_boolean(type_):
+        return 'in'
+    return 'contains'
+
+def _temporal(type_):
+    return pa.types.is_timestamp(type_) or pa.types.is_date(type_)
+
+def _text(expression):
+    return expression.cast(pa.string())
+
+def _text_array(values):
+    if pa.types.is_dictionary(values.type):
+        values = values.dictionary_decode()
+    return values.cast(pa.string())
+
+def expression(filters):
+    """Arrow predicate of ``(column, op, value)`` filters, all of which must hold.
+
+    ``range`` keeps values within ``(low, high)``, ``in`` one of the listed
+    values (compared as text) and ``contains`` values with the substring,
+    ignoring case.
+    """
+    predicate = None
+    for column, op, value in filters:
+        field = pc.field(column)
+        if op == 'range':
+            condition = (field >= value[0]) & (field <= value[1])
+        elif op == 'in':
+            condition = pc.is_in(_text(field), value_set=pa.array([str(v) for v in value], pa.string()))
+        elif op == 'contains':
+            condition = pc.match_substring(_text(field), value, ignore_case=True)
+        else:
+            raise ValueError(f"Unknown filter operation '{op}'")
+        predicate = condition if predicate is None else predicate & condition
+    return predicate
+
+def count(dataset, filters=()):
+    return dataset.count_rows(filter=expression(filters))
+
+def page(dataset, columns, filters=(), number=0, size=PAGE_SIZE):
+    """Rows ``number * size`` up to the next ``size`` of the filtered data.
+
+    Only ``columns`` are read, and only the batches up to the page.
+    """
+    start = number * size
+    rows = []
+    for batch in dataset.to_batches(columns=columns, filter=expression(filters)):
+        if start >= batch.num_rows:
+            start -= batch.num_rows
+            continue
+        rows.append(batch.slice(start, size - sum(len(b) for b in rows)))
+        start = 0
+        if sum(len(b) for b in rows) >= size:
+            break
+
+    if not rows:
+        return dataset.schema.empty_table().select(columns).to_pandas()
+    return pa.Table.from_batches(rows).to_pandas()
+
+def choices(dataset, column, limit=MAX_CHOICES):
+    """Distinct values of a column for a value filter, ``None`` if there are more than ``limit``."""
+    values = set()
+    for batch in dataset.to_batches(columns=[column]):
+        values.update(pc.unique(_text_array(batch.column(0))).drop_null().to_pylist())
+        if len(values) > limit:
+            return None
+    return sorted(values)
+
+def bounds(dataset, column):
+    """Minimum and maximum of a column, ``None`` if it has no values."""
+    result = pc.min_max(dataset.to_table(columns=[column]).column(0))
+    low, high = result['min'].as_py(), result['max'].as_py()
+    return None if low is None else (low, high)
+
+def histogram(dataset, column, filters=(), bins=BINS):
+    """Pre-binned distribution (``value`` and ``count``) of the filtered column.
+
+    Numeric columns are counted into ``bins`` equal-width bins batch by
+    batch, other columns by their ``TOP_K`` most frequent values, so the
+    chart gets at most a few dozen points instead of every row.
+    """
+    field = dataset.schema.field(column)
+    batches = lambda: (b.column(0) for b in dataset.to_batches(columns=[column], filter=expression(filters)))
+
+    if kind(field) != 'range':
+        counts = Counter()
+        for values in batches():
+            result = pc.value_counts(_text_array(values).drop_null())
+            counts.update(dict(zip(result.field('values').to_pylist(), result.field('counts').to_pylist())))
+        top = counts.most_common(TOP_K)
+        distribution = pd.DataFrame(top, columns=['value', 'count'])
+        if len(counts) > TOP_K:
+            other = sum(counts.values()) - distribution['count'].sum()
+            distribution = pd.concat([distribution, pd.DataFrame({'value': ['(other)'], 'count': [other]})], ignore_index=True)
+        return distribution
+
+    temporal = _temporal(field.type)
+
+    def numbers(values):
+        values = values.drop_null()
+        if temporal:
+            values = values.cast(pa.timestamp('ns')).cast(pa.int64())
+        return values.to_numpy(zero_copy_only=False)
+
+    # First pass for the range, second one for the counts
+    low, high = np.inf, -np.inf
+    for values in batches():
+        values = numbers(values)
+        if len(values):
+            low, high = min(low, values.min()), max(high, values.max())
+    if low > high:
+        return pd.DataFrame({'value': [], 'count': []})
+
+    edges = np.linspace(low, high, bins + 1) if high > low else np.array([low - 0.5, high + 0.5])
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for values in batches():
+        counts += np.histogram(numbers(values), bins=edges)[0]
+
+    centers = (edges[:-1] + edges[1:]) / 2
+    if temporal:
+        centers = pd.to_datetime(centers.astype(np.int64))
+    return pd.DataFrame({'value': centers, 'count': counts})
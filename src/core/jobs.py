@@ -0,0 +1,462 @@
+import datetime as dt
+import json
+import multiprocessing as mp
+import os
+import shutil
+import signal
+import threading
+import time
+import traceback
+import uuid
+
+from collections import deque
+from functools import cached_property
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from core import warmup
+from core.data import row_hashes
+from core.metrics import RunLog, frame_size
+
+JOB_DIR = Path('./src/_static/jobs')
+
+STAGES = ['sample', 'setup', 'compare', 'train', 'tune', 'performance', 'finalize']
+RETRAIN_STAGES = ['drift', 'retrain', 'export']
+ACTIVE = ('queued', 'running')
+
+WORKER_PRELOAD = ['core.training', 'core.selection', 'core.tuning', 'core.performance']
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    """Handle to a training job persisted in its own directory.
+
+    Every stage writes its result next to ``status.json``, so a job can be
+    reattached from any session and resumed after a restart without
+    recomputing finished stages.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @property
+    def id(self):
+        return self.path.name
+
+    @property
+    def status(self):
+        try:
+            with open(self.path / 'status.json', 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'id': self.id, 'state': 'unknown', 'stage': None, 'progress': 0}
+
+    @property
+    def params(self):
+        return self.status.get('params', {})
+
+    @property
+    def state(self):
+        return self.status['state']
+
+    def update(self, **values):
+        status = self.status
+        status.update(values, updated=dt.datetime.now().isoformat())
+        tmp = self.path / 'status.json.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(status, f, default=str)
+        os.replace(tmp, self.path / 'status.json')
+
+    @property
+    def cancelled(self):
+        return (self.path / 'cancel').exists()
+
+    def done(self, stage):
+        return (self.path / f'{stage}.pkl').exists()
+
+    def result(self, stage):
+        """Persisted tables/paths of a finished stage (without the model)."""
+        return joblib.load(self.path / f'{stage}.pkl')
+
+    def model(self, stage):
+        return joblib.load(self.path / f'{stage}_model.pkl')
+
+    def step(self, stage, func):
+        """Run ``func`` as ``stage`` once; reload its result when resuming."""
+        if self.done(stage):
+            result = self.result(stage)
+            if (self.path / f'{stage}_model.pkl').exists():
+                result['model'] = self.model(stage)
+            return result
+
+        if self.cancelled:
+            raise JobCancelled()
+
+        stages = RETRAIN_STAGES if stage in RETRAIN_STAGES else STAGES
+        self.update(stage=stage, progress=stages.index(stage) / len(stages))
+        with self.log.span(stage):
+            result = func()
+
+        if 'model' in result:
+            joblib.dump(result['model'], self.path / f'{stage}_model.pkl')
+        tables = {k: v for k, v in result.items() if k != 'model'}
+        joblib.dump(tables, self.path / f'{stage}.pkl.tmp')
+        os.replace(self.path / f'{stage}.pkl.tmp', self.path / f'{stage}.pkl')
+        return result
+
+    @property
+    def data(self):
+        return pd.read_parquet(self.path / 'data.parquet')
+
+    @property
+    def rows(self):
+        """Row hashes of the whole dataset the job was submitted for (``data`` may be a sample)."""
+        path = self.path / 'rows.npy'
+        return np.load(path) if path.exists() else row_hashes(self.data)
+
+    @cached_property
+    def log(self):
+        """Per-stage timings and memory of this job (``metrics.json``)."""
+        return RunLog(self.path / 'metrics.json')
+
+    @property
+    def deployable(self):
+        return self.path / 'final_model'
+
+def automl(job, df, params):
+    """Full AutoML run: setup, model search, training, tuning, evaluation."""
+    from core import parallel, performance, sampling, selection, training, tuning
+
+    metric = params['metric']
+
+    # Without a sample size, the smallest one that trains as well as more rows
+    if params.get('sample_size') is None:
+        # Rows without a label are not trained on, the size and order are of the others
+        df = df[df[params['target']].notna()]
+        chosen = job.step('sample', lambda: sampling.progressive(df, params['target'], metric))
+        df = sampling.sample(df, params['target'], chosen['size'])
+
+    job.update(stage='setup', progress=STAGES.index('setup') / len(STAGES))
+    setup = training.prepare(df, params['target'])
+    regression = setup.experiment
+    parallel.limit_threads(regression)
+
+    def setup_step():
+        return {'overview': setup.overview, 'cache': setup.key}
+
+    def compare():
+        if params.get('search') == 'exhaustive':
+            top = regression.compare_models(sort=metric)
+            leaderboard = regression.pull()
+            best_model_name = training.select_best(leaderboard)
+            model = top if best_model_name == leaderboard.index[0] else None
+            return {'leaderboard': leaderboard, 'best_model_name': best_model_name, 'model': model}
+
+        best_model_name, leaderboard, rungs, model = selection.successive_halving(
+            regression, metric, time_budget=params.get('budget'))
+        return {'leaderboard': leaderboard, 'rungs': rungs, 'best_model_name': best_model_name, 'model': model}
+
+    job.step('setup', setup_step)
+    compared = job.step('compare', compare)
+    best_model_name = compared['best_model_name']
+
+    def train():
+        # compare_models() already fitted the winner on the same folds
+        if compared.get('model') is not None:
+            results = training.remember(
+                regression, best_model_name, setup.key, compared['model'], compared['leaderboard'])
+            return {'model': compared['model'], 'results': results}
+
+        model, results = training.fit(regression, best_model_name, setup.key)
+        return {'model': model, 'results': results}
+
+    trained = job.step('train', train)
+    best = trained['model']
+
+    def tune():
+        if params.get('tuner') != 'random':
+            matrices = setup.matrices()
+            candidate, trials = tuning.tune(
+                regression, best, best_model_name,
+                matrices['X_train'], matrices['y_train'],
+                optimize=metric,
+                n_trials=50,
+                time_budget=params.get('tune_budget'),
+            )
+            if candidate is None and trials is not None:
+                # No trial finished within the budget, the untuned model stays
+                return {'model': best, 'results': trained['results'], 'trials': trials}
+            if candidate is not None:
+                model, results = training.fit(regression, candidate, setup.key)
+
+                # choose_better: keep the untuned model if tuning did not help
+                sign = 1 if tuning.SCORERS[metric][1] == 'maximize' else -1
+                if sign * results.loc['Mean', metric] < sign * trained['results'].loc['Mean', metric]:
+                    model, results = best, trained['results']
+                return {'model': model, 'results': results, 'trials': trials}
+
+        model = regression.tune_model(
+            best,
+            n_iter=50,
+            optimize = metric,
+            return_tuner= False,
+            choose_better = True
+        )
+        return {'model': model, 'results': regression.pull()}
+
+    tuned = job.step('tune', tune)
+
+    def evaluate():
+        files, importance = performance.generate_performance(
+            regression, tuned['model'], setup.matrices(), setup.columns, setup.key,
+            job.path / 'plots', optimize=metric)
+        return {
+            'metrics': tuned['results'].loc['Mean'],
+            'residuals': files['residuals'],
+            'errors': files['error'],
+            'feature_all': files['feature_all'],
+            'learning': files['learning'],
+            'interpret': files['pfi'],
+            'importance': importance,
+        }
+
+    job.step('performance', evaluate)
+
+    def finalize():
+        # Refit the tuned configuration once on train and test data
+        model, _ = training.fit(regression, tuned['model'], setup.key, full=True)
+        with job.log.span('save'):
+            regression.save_model(model, str(job.deployable))
+            regression.save_experiment(str(job.path / 'experiment.pkl'))
+        return {'model': model}
+
+    job.step('finalize', finalize)
+
+def summary(job):
+    """Model id, name and metrics of a finished job, full or incremental."""
+    if job.done('export'):
+        exported = job.result('export')
+        return {key: exported[key] for key in ('model_id', 'model_name', 'metrics')}
+
+    compared = job.result('compare')
+    model_id = compared['best_model_name']
+    return {
+        'model_id': model_id,
+        'model_name': compared['leaderboard'].loc[model_id, 'Model'],
+        'metrics': job.result('performance')['metrics'],
+    }
+
+def incremental(job, df, params):
+    """Update the model of the job ``params['base']`` with the new rows of ``df``.
+
+    Reuses the fitted preprocessing and the configuration of the base model
+    and only continues (or refits) its estimator. Returns ``False`` without
+    updating if the data drifted, then the job runs a full AutoML instead.
+    """
+    from pycaret.regression import load_model
+
+    from core import retrain
+
+    base = Job(job.path.parent / params['base'])
+    target = params['target']
+    base_df = base.data
+
+    known = base.rows
+    checked = job.step('drift', lambda: retrain.check(base_df, df, target, known))
+    if checked['drifted']:
+        return False
+
+    pipeline = load_model(str(base.deployable), verbose=False)
+
+    def update():
+        new = retrain.new_rows(known, df)
+        if len(new) == 0:
+            return {'model': pipeline, 'method': 'unchanged', 'scores': None, 'new_rows': 0}
+
+        # Compare on held out new rows, then update with all of them
+        holdout = new.sample(frac=retrain.HOLDOUT, random_state=int(os.environ.get('RANDOM_SEED', 42)))
+        candidate, method = retrain.update(pipeline, base_df, new.drop(holdout.index), target, len(known))
+        scores = retrain.evaluate(pipeline, candidate, holdout, target) if len(holdout) else None
+
+        if scores is not None and scores.loc['Updated model', 'RMSE'] > scores.loc['Current model', 'RMSE']:
+            return {'model': pipeline, 'method': 'kept', 'scores': scores, 'new_rows': len(new)}
+
+        model, method = retrain.update(pipeline, base_df, new, target, len(known))
+        return {'model': model, 'method': method, 'scores': scores, 'new_rows': len(new)}
+
+    updated = job.step('retrain', update)
+
+    def export():
+        joblib.dump(updated['model'], f'{job.deployable}.pkl')
+        shutil.copyfile(base.path / 'experiment.pkl', job.path / 'experiment.pkl')
+
+        # Kept with the job, as the next update may start from it
+        model = summary(base)
+        if updated['scores'] is not None:
+            model['metrics'] = updated['scores'].loc['Current model' if updated['method'] == 'kept' else 'Updated model']
+        return {'estimator': type(updated['model'].steps[-1][1]).__name__, **model}
+
+    job.step('export', export)
+    return True
+
+def run_job(path):
+    """Worker entry point: runs all training stages of the job at ``path``."""
+    job = Job(path)
+    job.update(state='running', pid=os.getpid(), error=None)
+
+    try:
+        from core import parallel, sampling
+
+        # Fold and candidate fits run on the configured execution backend
+        with parallel.execution():
+            params = job.params
+            with job.log.span('load') as info:
+                df = job.data
+                info.update(rows=len(df), columns=df.shape[1], memory_mb=round(frame_size(df) / 1024**2, 1))
+
+            if not (params.get('base') and incremental(job, df, params)):
+                # Drifted data is trained from scratch like a new dataset
+                if params.get('base'):
+                    df = sampling.sample(df, params['target'], params['sample_size'])
+                automl(job, df, params)
+            job.update(state='done', stage=None, progress=1.0)
+    except JobCancelled:
+        job.update(state='cancelled')
+    except Exception as e:
+        traceback.print_exc()
+        job.update(state='failed', error=f'{type(e).__name__}: {e}')
+
+class JobManager:
+    """Queue of training jobs executed by a bounded pool of worker processes.
+
+    Each job runs in its own process (so it can be cancelled hard), at most
+    ``max_workers`` at a time. Jobs left queued or running by a previous
+    server process are marked as interrupted and can be resumed.
+    """
+
+    def __init__(self, root=JOB_DIR, max_workers=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_workers = max_workers or int(os.environ.get('JOB_WORKERS', 2))
+
+        # Workers fork from a server process that has the ML stack imported
+        # already, instead of importing it again for every job
+        if 'forkserver' in mp.get_all_start_methods():
+            self._context = mp.get_context('forkserver')
+            if warmup.enabled():
+                self._context.set_forkserver_preload(WORKER_PRELOAD)
+        else:
+            self._context = mp.get_context('spawn')
+        self._queue = deque()
+        self._running = {}
+        self._lock = threading.Lock()
+
+        self._recover()
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def _recover(self):
+        for job in self.jobs():
+            if job.state in ACTIVE and not _alive(job.status.get('pid')):
+                job.update(state='interrupted', pid=None)
+                if os.environ.get('JOB_AUTO_RESUME', 'false').lower() == 'true':
+                    self.resume(job.id)
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                for job_id, process in list(self._running.items()):
+                    if not process.is_alive():
+                        process.join()
+                        del self._running[job_id]
+                        job = self.job(job_id)
+                        if job.state == 'running':
+                            job.update(state='failed', error=f'Worker exited with code {process.exitcode}')
+
+                while self._queue and len(self._running) < self.max_workers:
+                    job = self.job(self._queue.popleft())
+                    if job.state != 'queued':
+                        continue
+                    process = self._context.Process(target=run_job, args=(str(job.path),), daemon=False)
+                    process.start()
+                    self._running[job.id] = process
+            time.sleep(0.5)
+
+    def jobs(self):
+        jobs = [Job(p) for p in self.root.iterdir() if (p / 'status.json').exists()]
+        return sorted(jobs, key=lambda job: job.status.get('created', ''))
+
+    def job(self, job_id):
+        return Job(self.root / job_id)
+
+    def find(self, state=None, **params):
+        """Latest job that was submitted with the given parameters (and is in ``state``)."""
+        matches = [
+            job for job in self.jobs()
+            if all(job.params.get(k) == v for k, v in params.items()) and state in (None, job.state)
+        ]
+        return matches[-1] if matches else None
+
+    def submit(self, df, full=None, **params):
+        """Queue a job training on ``df``, a sample of ``full`` if given.
+
+        The row hashes of ``full`` are kept, so a later incremental job finds
+        the rows that are really new rather than those left out of the sample.
+        """
+        job = Job(self.root / uuid.uuid4().hex[:12])
+        job.path.mkdir(parents=True)
+        df.to_parquet(job.path / 'data.parquet')
+        if full is not None:
+            np.save(job.path / 'rows.npy', row_hashes(full))
+        job.update(
+            id=job.id,
+            state='queued',
+            stage=None,
+            progress=0,
+            params=params,
+            created=dt.datetime.now().isoformat()
+        )
+        with self._lock:
+            self._queue.append(job.id)
+        return job
+
+    def resume(self, job_id):
+        job = self.job(job_id)
+        (job.path / 'cancel').unlink(missing_ok=True)
+        job.update(state='queued', error=None)
+        with self._lock:
+            if job_id not in self._queue and job_id not in self._running:
+                self._queue.append(job_id)
+        return job
+
+    def cancel(self, job_id):
+        job = self.job(job_id)
+        (job.path / 'cancel').touch()
+        with self._lock:
+            if job_id in self._queue:
+                self._queue.remove(job_id)
+            process = self._running.pop(job_id, None)
+        if process is not None:
+            process.terminate()
+            process.join()
+        elif job.state == 'running' and _alive(job.status.get('pid')):
+            # Worker left over from a previous server process
+            os.kill(job.status['pid'], signal.SIGTERM)
+        job.update(state='cancelled', pid=None)
+        return job
+
+    def delete(self, job_id):
+        self.cancel(job_id)
+        shutil.rmtree(self.root / job_id, ignore_errors=True)
+
+def _alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,108 @@
+import datetime as dt
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+
+from contextlib import contextmanager
+from pathlib import Path
+
+MB = 1024**2
+
+def rss():
+    """Resident set size of this process in bytes, ``None`` if unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+def peak_rss():
+    """Highest resident set size of this process so far, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def frame_size(df):
+    """Memory held by a dataframe including its object columns, in bytes."""
+    return int(df.memory_usage(deep=True).sum())
+
+class RunLog:
+    """Timings and memory of the stages of one run, kept as a JSON file.
+
+    Each ``span`` records the wall time of its block, the RSS before it and
+    the peak RSS reached meanwhile (sampled every ``interval`` seconds), plus
+    any info the block adds. Spans of an existing log are kept, so a resumed
+    run continues its log.
+    """
+
+    def __init__(self, path=None, interval=0.05):
+        self.path = None if path is None else Path(path)
+        self.interval = interval
+        self.spans = []
+        if self.path is not None and self.path.exists():
+            try:
+                with open(self.path, 'r') as f:
+                    self.spans = json.load(f)['spans']
+            except (ValueError, KeyError):
+                pass
+
+    @contextmanager
+    def span(self, name, **info):
+        before = rss()
+        peak = [before or 0]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(self.interval):
+                peak[0] = max(peak[0], rss() or 0)
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        started, wall = time.perf_counter(), dt.datetime.now()
+        try:
+            yield info
+        finally:
+            seconds = time.perf_counter() - started
+            stop.set()
+            sampler.join()
+            after = rss()
+            record = {'name': name, 'started': wall.isoformat(), 'seconds': round(seconds, 4)}
+            if before is not None:
+                record.update(
+                    rss_mb=round(after / MB, 1),
+                    peak_delta_mb=round((max(peak[0], after) - before) / MB, 1),
+                )
+            record.update(info)
+            self.spans.append(record)
+            self.save()
+
+    def timed(self, name=None):
+        """Decorator running the function in a span (named after it by default)."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def totals(self):
+        """Seconds and largest peak per span name."""
+        totals = {}
+        for record in self.spans:
+            total = totals.setdefault(record['name'], {'seconds': 0.0, 'peak_delta_mb': 0.0})
+            total['seconds'] += record['seconds']
+            total['peak_delta_mb'] = max(total['peak_delta_mb'], record.get('peak_delta_mb') or 0.0)
+        return totals
+
+    def save(self):
+        if self.path is None:
+            return
+        tmp = self.path.with_name(f'{self.path.name}.{uuid.uuid4().hex[:8]}')
+        with open(tmp, 'w') as f:
+            json.dump({'spans': self.spans, 'peak_rss_mb': round(peak_rss() / MB, 1)}, f, indent=2, default=str)
+        os.replace(tmp, self.path)
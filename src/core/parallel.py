@@ -0,0 +1,109 @@
+import os
+
+from contextlib import contextmanager
+
+BACKENDS = ('sequential', 'threads', 'processes', 'dask', 'ray')
+
+# Packages the distributed backends need, they are not installed by default
+BACKEND_PACKAGES = {'dask': 'dask[distributed]', 'ray': 'ray'}
+
+# Constructor arguments of multithreaded estimators setting their thread count
+THREAD_PARAMS = ('n_jobs', 'thread_count', 'nthread')
+
+def backend():
+    name = os.environ.get('EXECUTION_BACKEND', 'processes').lower()
+    if name not in BACKENDS:
+        raise ValueError(f"EXECUTION_BACKEND must be one of {', '.join(BACKENDS)}, not '{name}'")
+    return name
+
+def _missing(name, error):
+    return ImportError(
+        f"EXECUTION_BACKEND={name} needs the optional package '{BACKEND_PACKAGES[name]}', "
+        f"install it with: pip install \"{BACKEND_PACKAGES[name]}\" ({error})")
+
+def workers():
+    """Fold and candidate fits running at once."""
+    if backend() == 'sequential':
+        return 1
+    return int(os.environ.get('EXECUTION_WORKERS', 0)) or os.cpu_count()
+
+def threads():
+    """Threads per fit, so that workers times threads does not exceed the CPUs."""
+    if backend() in ('dask', 'ray') and os.environ.get('EXECUTION_ADDRESS'):
+        return int(os.environ.get('EXECUTION_THREADS', 1))
+    return int(os.environ.get('EXECUTION_THREADS', 0)) or max(1, os.cpu_count() // workers())
+
+def limit_threads(regression, count=None):
+    """Cap the threads of the multithreaded estimators of a set up experiment.
+
+    PyCaret passes its ``n_jobs`` to both the cross-validation and the
+    estimators, which would start ``n_jobs`` threads in each of ``n_jobs``
+    parallel fits.
+    """
+    count = count or threads()
+    for container in getattr(regression, '_all_models_internal', {}).values():
+        for param in THREAD_PARAMS:
+            if param in container.args:
+                container.args[param] = count
+
+@contextmanager
+def execution(name=None):
+    """Dispatch joblib work through the configured backend.
+
+    PyCaret cross-validates with joblib, so every fold fit of
+    ``create_model``, ``compare_models`` and ``tune_model`` inside the block
+    runs on the backend. ``processes`` memory-maps large arrays into shared
+    memory instead of pickling them per task, ``dask`` and ``ray`` scatter
+    them once per call to their workers. With ``EXECUTION_ADDRESS`` they
+    connect to an existing cluster of several machines instead of starting
+    a local one.
+    """
+    from joblib import parallel_backend
+    from threadpoolctl import threadpool_limits
+
+    name = name or backend()
+    count = workers()
+    address = os.environ.get('EXECUTION_ADDRESS') or None
+
+    if name == 'sequential':
+        with parallel_backend('sequential'):
+            yield
+    elif name == 'threads':
+        with parallel_backend('threading', n_jobs=count), threadpool_limits(threads()):
+            yield
+    elif name == 'processes':
+        with parallel_backend('loky', n_jobs=count, inner_max_num_threads=threads()):
+            yield
+    elif name == 'dask':
+        try:
+            from dask.distributed import Client, LocalCluster
+        except ImportError as error:
+            raise _missing(name, error) from error
+
+        if address:
+            client = Client(address)
+        else:
+            env = {var: str(threads()) for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')}
+            client = Client(LocalCluster(n_workers=count, threads_per_worker=1, processes=True, env=env))
+        try:
+            with parallel_backend('dask'):
+                yield
+        finally:
+            client.close()
+            if not address:
+                client.cluster.close()
+    elif name == 'ray':
+        try:
+            import ray
+
+            from ray.util.joblib import register_ray
+        except ImportError as error:
+            raise _missing(name, error) from error
+
+        register_ray()
+        ray.init(address=address, num_cpus=None if address else count, ignore_reinit_error=True)
+        try:
+            with parallel_backend('ray', n_jobs=count):
+                yield
+        finally:
+            ray.shutdown()
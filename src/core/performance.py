@@ -0,0 +1,140 @@
+import multiprocessing as mp
+import os
+import shutil
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from core.cache import CACHE_DIR
+
+PLOTS = ['residuals', 'error', 'feature_all', 'learning']
+PLOT_CACHE = CACHE_DIR / 'plots'
+
+# Experiment of the plot worker process, loaded once by ``_load``
+_state = {}
+
+def _context():
+    """Start method for plot workers.
+
+    Job workers run threads (metric sampler, joblib backends) and have
+    OpenMP initialised by the estimators, so forking them could deadlock
+    the learning curve refits. Workers start clean and load the experiment.
+    """
+    if 'forkserver' in mp.get_all_start_methods():
+        context = mp.get_context('forkserver')
+        context.set_forkserver_preload(['pycaret.regression'])
+        return context
+    return mp.get_context('spawn')
+
+def _load(experiment, data, model, path):
+    from pycaret.regression import load_experiment
+
+    _state.update(
+        regression=load_experiment(experiment, data=joblib.load(data), preprocess_data=False),
+        model=joblib.load(model),
+        path=path,
+    )
+
+def _plot(plot):
+    regression, model, path = _state['regression'], _state['model'], _state['path']
+    return regression.plot_model(model, plot=plot, save=path)
+
+def permutation_importance(model, X, y, columns, scoring, sample=None, repeats=5, seed=None):
+    """Permutation feature importance on a subsample, permutations in parallel."""
+    from sklearn.inspection import permutation_importance as pfi
+
+    sample = sample or int(os.environ.get('PFI_SAMPLE', 5000))
+    rng = np.random.RandomState(seed)
+    rows = rng.choice(len(X), size=min(sample, len(X)), replace=False)
+    result = pfi(model, np.asarray(X[np.sort(rows)]), np.asarray(y[np.sort(rows)]),
+                 scoring=scoring, n_repeats=repeats, n_jobs=-1, random_state=seed)
+
+    return pd.DataFrame({
+        'Feature': columns,
+        'Importance': result.importances_mean,
+        'Std': result.importances_std,
+    }).sort_values('Importance', ascending=False, ignore_index=True)
+
+def plot_importance(importance, file, top=20):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    data = importance.head(top).iloc[::-1]
+    fig, ax = plt.subplots(figsize=(8, max(3, 0.35 * len(data))))
+    ax.barh(data['Feature'], data['Importance'], xerr=data['Std'], color='#0055a1')
+    ax.set_xlabel('Mean score decrease')
+    ax.set_title('Permutation Feature Importance')
+    fig.tight_layout()
+    fig.savefig(file)
+    plt.close(fig)
+    return file
+
+def generate_performance(regression, model, matrices, columns, dataset, path, optimize='RMSE'):
+    """Performance plots and permutation importance of ``model``.
+
+    The plots are rendered concurrently in worker processes while the
+    permutation importance is computed on a subsample of the transformed test
+    set. Everything is cached by (model hash, dataset key, scorer, sample
+    size) and copied to ``path``; returns the plot files and the importance
+    table.
+    """
+    scoring = 'r2' if optimize == 'R2' else 'neg_root_mean_squared_error'
+    sample = int(os.environ.get('PFI_SAMPLE', 5000))
+    key = joblib.hash((joblib.hash(model), dataset, scoring, sample))
+    cached = PLOT_CACHE / key
+
+    if not (cached / 'performance.pkl').exists():
+        tmp = PLOT_CACHE / f'.{key}.{os.getpid()}'
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        save = str(tmp) + '/'
+
+        workers = min(len(PLOTS), int(os.environ.get('PLOT_WORKERS', 0)) or os.cpu_count())
+        seed = regression.get_config('seed')
+
+        _state.update(regression=regression, model=model, path=save)
+        try:
+            if workers > 1:
+                # Handed to the workers as files, they are not forked copies of this process
+                state = tmp / '.state'
+                state.mkdir()
+                regression.save_experiment(str(state / 'experiment.pkl'))
+                joblib.dump(regression.get_config('dataset'), state / 'data.pkl')
+                joblib.dump(model, state / 'model.pkl')
+                initargs = (str(state / 'experiment.pkl'), str(state / 'data.pkl'), str(state / 'model.pkl'), save)
+
+                with ProcessPoolExecutor(max_workers=workers, mp_context=_context(),
+                                         initializer=_load, initargs=initargs) as executor:
+                    futures = {plot: executor.submit(_plot, plot) for plot in PLOTS}
+                    importance = permutation_importance(
+                        model, matrices['X_test'], matrices['y_test'], columns, scoring, sample, seed=seed)
+                    files = {plot: futures[plot].result() for plot in PLOTS}
+            else:
+                files = {plot: _plot(plot) for plot in PLOTS}
+                importance = permutation_importance(
+                    model, matrices['X_test'], matrices['y_test'], columns, scoring, sample, seed=seed)
+        finally:
+            _state.clear()
+            shutil.rmtree(tmp / '.state', ignore_errors=True)
+
+        files['pfi'] = plot_importance(importance, tmp / 'Permutation Feature Importance.png')
+        files = {plot: Path(file).name for plot, file in files.items()}
+        joblib.dump({'files': files, 'importance': importance}, tmp / 'performance.pkl')
+
+        if cached.exists():
+            shutil.rmtree(tmp, ignore_errors=True)
+        else:
+            os.replace(tmp, cached)
+
+    result = joblib.load(cached / 'performance.pkl')
+    Path(path).mkdir(parents=True, exist_ok=True)
+    files = {}
+    for plot, name in result['files'].items():
+        files[plot] = str(Path(path) / name)
+        shutil.copyfile(cached / name, files[plot])
+    return files, result['importance']
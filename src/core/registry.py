@@ -0,0 +1,151 @@
+import datetime as dt
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+from collections import OrderedDict
+from pathlib import Path
+
+REGISTRY_DIR = Path('./src/_static/model/registry')
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class ModelCache:
+    """Process-wide LRU cache of loaded models, bounded by their size on disk.
+
+    Entries are keyed by the content hash of the pickle, so a file changed in
+    place is loaded again while the same model under another path is not.
+    Hashes are only recomputed when a file's mtime or size changes.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or int(float(os.environ.get('MODEL_CACHE_MB', 1024)) * 1024**2)
+        self._models = OrderedDict()
+        self._hashes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def digest(self, path):
+        stat = Path(path).stat()
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        if key not in self._hashes:
+            self._hashes[key] = _sha256(path)
+        return self._hashes[key], stat.st_size
+
+    def load(self, path):
+        """Model pickled at ``path`` (a ``.pkl`` file saved by PyCaret)."""
+        from pycaret.regression import load_model
+
+        digest, size = self.digest(path)
+        with self._lock:
+            if digest in self._models:
+                self._models.move_to_end(digest)
+                return self._models[digest][0]
+
+        model = load_model(str(path)[:-len('.pkl')], verbose=False)
+
+        with self._lock:
+            if digest not in self._models:
+                self._models[digest] = (model, size)
+                self._bytes += size
+            while self._bytes > self.max_bytes and len(self._models) > 1:
+                _, (_, evicted) = self._models.popitem(last=False)
+                self._bytes -= evicted
+        return model
+
+model_cache = ModelCache()
+
+class ModelRegistry:
+    """Versioned, content-addressed store of model pickles.
+
+    Every registered model is kept as ``objects/<sha256>.pkl`` with its
+    metadata in ``index.json``; aliases like ``deployed`` or ``uploaded``
+    point to a version.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = Path(root)
+        (self.root / 'objects').mkdir(parents=True, exist_ok=True)
+
+    def _index(self):
+        try:
+            with open(self.root / 'index.json', 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'versions': {}, 'aliases': {}}
+
+    def _save(self, index):
+        tmp = self.root / f'index.json.{uuid.uuid4().hex[:8]}'
+        with open(tmp, 'w') as f:
+            json.dump(index, f, indent=2, default=str)
+        os.replace(tmp, self.root / 'index.json')
+
+    def register(self, source, alias=None, **metadata):
+        """Store ``source`` (path of a ``.pkl`` or its bytes) as a version."""
+        tmp = self.root / 'objects' / f'.{uuid.uuid4().hex}.pkl'
+        if isinstance(source, (bytes, bytearray)):
+            tmp.write_bytes(source)
+        else:
+            shutil.copyfile(source, tmp)
+
+        digest = _sha256(tmp)
+        path = self.root / 'objects' / f'{digest}.pkl'
+        if path.exists():
+            tmp.unlink()
+        else:
+            os.replace(tmp, path)
+
+        with self._lock:
+            index = self._index()
+            version = index['versions'].get(digest) or {
+                'id': digest,
+                'created': dt.datetime.now().isoformat(),
+                'size': path.stat().st_size,
+            }
+            version.update(metadata)
+            index['versions'][digest] = version
+            if alias is not None:
+                index['aliases'][alias] = digest
+            self._save(index)
+        return version
+
+    def versions(self):
+        """All versions, newest first, with the aliases pointing to them."""
+        index = self._index()
+        aliases = {}
+        for alias, digest in index['aliases'].items():
+            aliases.setdefault(digest, []).append(alias)
+        versions = [dict(v, aliases=aliases.get(v['id'], [])) for v in index['versions'].values()]
+        return sorted(versions, key=lambda v: v['created'], reverse=True)
+
+    def version(self, ref):
+        """Version of an alias or a (prefix of a) version id, or ``None``."""
+        index = self._index()
+        digest = index['aliases'].get(ref, ref)
+        matches = [v for d, v in index['versions'].items() if d.startswith(digest)]
+        return matches[0] if len(matches) == 1 else None
+
+    def path(self, ref):
+        version = self.version(ref)
+        return None if version is None else self.root / 'objects' / f"{version['id']}.pkl"
+
+    def exists(self, ref):
+        path = self.path(ref)
+        return path is not None and path.exists()
+
+    def load(self, ref):
+        """Loaded model of ``ref``, shared through the process-wide cache."""
+        path = self.path(ref)
+        if path is None:
+            raise KeyError(f"Unknown model '{ref}'")
+        return model_cache.load(path)
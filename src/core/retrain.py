@@ -0,0 +1,138 @@
+import copy
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.data import row_hashes
+
+DRIFT_THRESHOLD = 0.2
+BINS = 10
+HOLDOUT = 0.2
+
+def new_rows(known, df):
+    """Rows of ``df`` whose hash is not in ``known`` (``row_hashes`` of the base data)."""
+    return df[~np.isin(row_hashes(df), known)]
+
+def psi(expected, actual, bins=BINS):
+    """Population stability index of ``actual`` against ``expected``."""
+    expected, actual = expected.dropna(), actual.dropna()
+    if len(expected) == 0 or len(actual) == 0:
+        return 0.0
+
+    if pd.api.types.is_numeric_dtype(expected) and not pd.api.types.is_bool_dtype(expected):
+        edges = np.unique(np.quantile(expected.astype('float64'), np.linspace(0, 1, bins + 1)))
+        if len(edges) < 2:
+            return 0.0
+        edges[0], edges[-1] = -np.inf, np.inf
+        p = np.histogram(expected, edges)[0] / len(expected)
+        q = np.histogram(actual, edges)[0] / len(actual)
+    else:
+        if pd.api.types.is_datetime64_any_dtype(expected):
+            expected, actual = expected.dt.to_period('M').astype(str), actual.dt.to_period('M').astype(str)
+        p = expected.astype(str).value_counts(normalize=True)
+        q = actual.astype(str).value_counts(normalize=True)
+        p, q = p.align(q, fill_value=0)
+        p, q = p.to_numpy(), q.to_numpy()
+
+    p, q = np.clip(p, 1e-4, None), np.clip(q, 1e-4, None)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+def drift(base, new, target):
+    """PSI per feature between the training data and the new rows."""
+    rows = [(column, psi(base[column], new[column])) for column in base.columns if column != target]
+    return pd.DataFrame(rows, columns=['Column', 'PSI']).sort_values('PSI', ascending=False, ignore_index=True)
+
+def check(base, df, target, known, threshold=None):
+    """Whether ``df`` can update the model trained on ``base`` incrementally.
+
+    Rows are new if their hash is not in ``known``, the hashes of the whole
+    base dataset (``base`` may be a sample of it). Not if the columns changed
+    or the features of the new rows drifted by more than ``threshold`` (PSI)
+    in any column.
+    """
+    threshold = threshold or float(os.environ.get('DRIFT_THRESHOLD', DRIFT_THRESHOLD))
+
+    if list(df.columns) != list(base.columns) or any(df.dtypes != base.dtypes):
+        return {'drifted': True, 'reason': 'The columns of the dataset changed.', 'drift': None, 'new_rows': None}
+
+    new = new_rows(known, df)
+    if len(new) == 0:
+        return {'drifted': False, 'reason': 'No new rows.', 'drift': None, 'new_rows': 0}
+
+    table = drift(base, new, target)
+    drifted = bool(table['PSI'].max() > threshold)
+    reason = f"PSI of {table['Column'].iloc[0]} is {table['PSI'].iloc[0]:.2f} (threshold {threshold})"
+    return {'drifted': drifted, 'reason': reason, 'drift': table, 'new_rows': len(new)}
+
+# CatBoost accepts only one of its aliases for the number of trees
+CATBOOST_ROUNDS = ('iterations', 'n_estimators', 'num_boost_round', 'num_trees')
+
+def _rounds(fitted, share):
+    return max(10, round(fitted * share))
+
+def warm_start(estimator, X, y, share):
+    """Continue training a boosted model on ``X``/``y``, ``None`` if unsupported.
+
+    Adds a ``share`` of the model's fitted boosting rounds (at least 10).
+    The round count is read from the fitted model, as PyCaret leaves it
+    unset for untuned models.
+    """
+    from sklearn.base import clone
+
+    kind = type(estimator).__name__
+
+    if kind == 'LGBMRegressor':
+        rounds = _rounds(estimator.booster_.current_iteration(), share)
+        return clone(estimator).set_params(n_estimators=rounds).fit(X, y, init_model=estimator.booster_)
+    if kind == 'XGBRegressor':
+        rounds = _rounds(estimator.get_booster().num_boosted_rounds(), share)
+        return clone(estimator).set_params(n_estimators=rounds).fit(X, y, xgb_model=estimator.get_booster())
+    if kind == 'CatBoostRegressor':
+        params = estimator.get_params()
+        name = next((alias for alias in CATBOOST_ROUNDS if params.get(alias) is not None), 'iterations')
+        model = clone(estimator)
+        model.set_params(**{name: _rounds(estimator.tree_count_, share)})
+        return model.fit(X, y, init_model=estimator, verbose=False)
+    return None
+
+def update(pipeline, base, new, target, base_rows=None):
+    """Pipeline updated with ``new`` rows, keeping its fitted preprocessing.
+
+    Boosted models continue training on the new rows, with rounds in
+    proportion to their share of ``base_rows`` (the size of the whole base
+    dataset) and new rows. Other estimators are refitted on base and new
+    rows. Returns the pipeline and the method used.
+    """
+    from sklearn.base import clone
+
+    transform, (name, estimator) = pipeline[:-1], pipeline.steps[-1]
+    share = len(new) / ((base_rows or len(base)) + len(new))
+
+    X_new = transform.transform(new.drop(columns=target))
+    model = warm_start(estimator, X_new, new[target], share)
+    method = 'warm start'
+
+    if model is None:
+        merged = pd.concat([base, new], ignore_index=True)
+        model = clone(estimator).fit(transform.transform(merged.drop(columns=target)), merged[target])
+        method = 'refit'
+
+    updated = copy.copy(pipeline)
+    updated.steps = [*pipeline.steps[:-1], (name, model)]
+    return updated, method
+
+def evaluate(old, new, data, target):
+    """RMSE, MAE and R2 of the old and the updated pipeline on ``data``."""
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    X, y = data.drop(columns=target), data[target]
+    scores = {}
+    for label, pipeline in (('Current model', old), ('Updated model', new)):
+        prediction = pipeline.predict(X)
+        scores[label] = {
+            'RMSE': float(np.sqrt(mean_squared_error(y, prediction))),
+            'MAE': float(mean_absolute_error(y, prediction)),
+            'R2': float(r2_score(y, prediction)),
+        }
+    return pd.DataFrame(scores).T
@@ -0,0 +1,125 @@
+"""Pipeline-free inference for models compiled by ``core.compiler``.
+
+Only needs NumPy, pandas and the estimator's own library, so this module is
+also copied verbatim into generated APIs.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+
+def _date_features(X, step):
+    for column in step['columns']:
+        values = pd.to_datetime(X[column], errors='coerce')
+        for feature in step['features']:
+            if feature == 'week':
+                X[f'{column}_{feature}'] = values.dt.isocalendar().week.astype('float64')
+            else:
+                X[f'{column}_{feature}'] = getattr(values.dt, feature)
+        X = X.drop(columns=column)
+    return X
+
+
+def _impute(X, step):
+    for column, value in step['values'].items():
+        if column in X:
+            X[column] = X[column].where(X[column].notna(), value)
+    return X
+
+
+def _ordinal(X, step):
+    for column, mapping in step['mapping'].items():
+        X[column] = X[column].astype(str).map(mapping).astype('float64').fillna(-1)
+    return X
+
+
+def _target(X, step):
+    for column, (mapping, default) in step['mapping'].items():
+        X[column] = X[column].astype(str).map(mapping).astype('float64').fillna(default)
+    return X
+
+
+def _onehot(X, step):
+    for column, (categories, names) in step['mapping'].items():
+        values = X[column].astype(str).to_numpy()
+        position = X.columns.get_loc(column)
+        encoded = pd.DataFrame(
+            (values[:, None] == np.asarray(categories, dtype=object)[None, :]).astype('float64'),
+            columns=names, index=X.index)
+        X = pd.concat([X.iloc[:, :position], encoded, X.iloc[:, position + 1:]], axis=1)
+    return X
+
+
+def _scale(X, step):
+    columns = step['columns']
+    X[columns] = (X[columns].to_numpy(dtype='float64') - np.asarray(step['mean'])) / np.asarray(step['scale'])
+    return X
+
+
+def _clean_names(X, step):
+    X.columns = [re.sub(step['pattern'], '', str(column)) for column in X.columns]
+    return X
+
+
+STEPS = {
+    'date_features': _date_features,
+    'impute': _impute,
+    'ordinal': _ordinal,
+    'target': _target,
+    'onehot': _onehot,
+    'scale': _scale,
+    'clean_names': _clean_names,
+}
+
+
+class CompiledModel:
+    """Transform chain plus estimator loaded from a compiled artifact directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'model.json'), 'r') as f:
+            self.spec = json.load(f)
+        self.estimator = self._load_estimator(self.spec['estimator'])
+
+    def _load_estimator(self, spec):
+        file = os.path.join(self.path, spec.get('file', ''))
+        kind = spec['kind']
+        if kind == 'lightgbm':
+            import lightgbm
+            return lightgbm.Booster(model_file=file)
+        if kind == 'xgboost':
+            import xgboost
+            booster = xgboost.Booster()
+            booster.load_model(file)
+            return booster
+        if kind == 'catboost':
+            from catboost import CatBoostRegressor
+            return CatBoostRegressor().load_model(file)
+        if kind == 'linear':
+            return np.asarray(spec['coef'], dtype='float64'), float(spec['intercept'])
+        import joblib
+        return joblib.load(file)
+
+    def transform(self, data):
+        X = data[self.spec['inputs']].copy()
+        for column in self.spec['datetimes']:
+            X[column] = pd.to_datetime(X[column], errors='coerce')
+        for column in self.spec['numerics']:
+            X[column] = pd.to_numeric(X[column], errors='coerce')
+        for step in self.spec['steps']:
+            X = STEPS[step['type']](X, step)
+        return X[self.spec['outputs']].to_numpy(dtype='float64')
+
+    def predict(self, data):
+        X = self.transform(data)
+        kind = self.spec['estimator']['kind']
+        if kind == 'linear':
+            coef, intercept = self.estimator
+            return X @ coef + intercept
+        if kind == 'xgboost':
+            return self.estimator.inplace_predict(X)
+        return np.asarray(self.estimator.predict(X), dtype='float64')
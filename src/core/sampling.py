@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Quantile bins of numeric targets the sample is stratified on
+BINS = 10
+MAX_DATASETS = 8
+
+START_ROWS = 1_000
+GROWTH = 2
+TOLERANCE = 0.01
+HOLDOUT_ROWS = 10_000
+
+_orders = OrderedDict()
+_lock = threading.Lock()
+
+def _seed(seed):
+    return int(os.environ.get('RANDOM_SEED', 42)) if seed is None else seed
+
+def strata(y, bins=BINS):
+    """Stratum of every row: quantile bin of numeric targets, else the value (missing is its own)."""
+    if pd.api.types.is_numeric_dtype(y) and not pd.api.types.is_bool_dtype(y):
+        if y.notna().sum() < bins:
+            return np.where(y.notna(), 0, -1)
+        codes = pd.qcut(y.rank(method='first'), q=bins, labels=False)
+        return codes.fillna(-1).to_numpy(dtype=np.int64)
+    return pd.factorize(y)[0]
+
+def sampling_order(df, target, seed=None):
+    """Positions of all rows in the order they enter a sample.
+
+    Rows are shuffled within their stratum and the strata interleaved in
+    proportion to their size, so every prefix is a stratified sample and
+    smaller samples are contained in larger ones.
+    """
+    rng = np.random.default_rng(_seed(seed))
+    frame = pd.DataFrame({'stratum': strata(df[target]), 'noise': rng.random(len(df))})
+    grouped = frame.groupby('stratum')['noise']
+    rank = grouped.rank(method='first').to_numpy()
+    size = grouped.transform('size').to_numpy()
+    # Relative position within the stratum, jittered so strata alternate evenly
+    return np.argsort((rank - rng.random(len(df))) / size, kind='stable')
+
+def order(df, target, dataset=None, seed=None):
+    """``sampling_order`` of a dataset, computed once per fingerprint, target and seed.
+
+    The orders of the ``MAX_DATASETS`` most recently used datasets are kept
+    process-wide. Without ``dataset`` the order is not cached.
+    """
+    if dataset is None:
+        return sampling_order(df, target, seed)
+
+    key = (dataset, target, _seed(seed))
+    with _lock:
+        if key in _orders:
+            _orders.move_to_end(key)
+            return _orders[key]
+
+    positions = sampling_order(df, target, seed)
+
+    with _lock:
+        _orders[key] = positions
+        while len(_orders) > MAX_DATASETS:
+            _orders.popitem(last=False)
+    return positions
+
+def sample(df, target, size, dataset=None, seed=None):
+    """Deterministic stratified sample of ``size`` rows in their original order."""
+    if size is None or size >= len(df):
+        return df
+    return df.iloc[np.sort(order(df, target, dataset, seed)[:size])]
+
+def _encode(df, target):
+    """Numeric matrix for the probe model and the mask of its categorical columns."""
+    X, categorical = {}, []
+    for column in df.columns.drop(target):
+        values = df[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            ints = pd.Series(values.to_numpy(dtype='datetime64[ns]').view('int64'), index=values.index)
+            X[column] = ints.where(values.notna()).astype('float64')
+            categorical.append(False)
+        elif pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+            X[column] = values.astype('float64')
+            categorical.append(False)
+        else:
+            codes = pd.Series(pd.factorize(values)[0], index=values.index)
+            X[column] = codes.where(codes >= 0).astype('float64')
+            # Native categorical splits support up to 255 levels, more stay ordinal
+            categorical.append(bool(codes.max() < 255))
+    return pd.DataFrame(X, index=df.index), categorical
+
+def progressive(df, target, metric='RMSE', start=None, growth=None, tolerance=None, seed=None):
+    """Smallest sample size that trains about as well as larger ones.
+
+    A fast probe model (histogram gradient boosting) is trained on growing
+    prefixes of the sampling order, ``start`` rows times ``growth`` per
+    step, and validated on a fixed stratified holdout taken from its end.
+    Growing stops once ``metric`` improves by less than ``tolerance``
+    (relative for RMSE, absolute for R2), and the previous size is chosen.
+
+    Returns the chosen size and the learning curve.
+    """
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    from sklearn.metrics import mean_squared_error, r2_score
+
+    start = start or int(os.environ.get('SAMPLING_START', START_ROWS))
+    growth = growth or float(os.environ.get('SAMPLING_GROWTH', GROWTH))
+    tolerance = tolerance or float(os.environ.get('SAMPLING_TOLERANCE', TOLERANCE))
+
+    df = df[df[target].notna()]
+    positions = order(df, target, seed=seed)
+    holdout = min(HOLDOUT_ROWS, len(df) // 5)
+    pool = len(df) - holdout
+    if pool <= start or holdout == 0:
+        return {'size': len(df), 'curve': None}
+
+    X, categorical = _encode(df, target)
+    y = df[target].to_numpy(dtype='float64')
+    X_val, y_val = X.iloc[positions[pool:]], y[positions[pool:]]
+
+    sizes = []
+    size = start
+    while size < pool:
+        sizes.append(size)
+        size = int(size * growth)
+    sizes.append(pool)
+
+    rows, chosen = [], len(df)
+    for size in sizes:
+        train = positions[:size]
+        started = time.perf_counter()
+        model = HistGradientBoostingRegressor(categorical_features=categorical, random_state=_seed(seed))
+        prediction = model.fit(X.iloc[train], y[train]).predict(X_val)
+        rows.append({
+            'Rows': size,
+            'RMSE': float(np.sqrt(mean_squared_error(y_val, prediction))),
+            'R2': float(r2_score(y_val, prediction)),
+            'Seconds': time.perf_counter() - started,
+        })
+
+        if len(rows) > 1:
+            previous, current = rows[-2][metric], rows[-1][metric]
+            gain = (previous - current) / max(abs(previous), 1e-12) if metric == 'RMSE' else current - previous
+            if gain < tolerance:
+                chosen = rows[-2]['Rows']
+                break
+
+    return {'size': chosen, 'curve': pd.DataFrame(rows)}
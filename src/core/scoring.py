@@ -0,0 +1,39 @@
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CHUNK_ROWS = 100_000
+
+def score_parquet(model, source, target, keep=(), chunk_rows=CHUNK_ROWS, progress=None):
+    """Score a Parquet file chunk by chunk and write the predictions to ``target``.
+
+    Only one chunk of ``chunk_rows`` rows is in memory at a time. The output
+    holds the ``keep`` input columns and ``prediction_label``. ``progress`` is
+    called with (rows done, total rows, rows per second) after every chunk.
+    """
+    from pycaret.regression import predict_model
+
+    pf = pq.ParquetFile(source)
+    total = pf.metadata.num_rows
+    started, done, writer = time.perf_counter(), 0, None
+
+    try:
+        for batch in pf.iter_batches(batch_size=chunk_rows):
+            data = batch.to_pandas()
+            predictions = predict_model(model, data=data, verbose=False)['prediction_label']
+
+            result = data[list(keep)].assign(prediction_label=predictions.to_numpy())
+            table = pa.Table.from_pandas(result, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(target, table.schema)
+            writer.write_table(table)
+
+            done += len(data)
+            if progress is not None:
+                progress(done, total, done / max(time.perf_counter() - started, 1e-9))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return done, time.perf_counter() - started
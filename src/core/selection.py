@@ -0,0 +1,107 @@
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from sklearn.model_selection import KFold
+
+MIN_ROWS = 50
+
+class SubsampledKFold(KFold):
+    """K-fold splitter that fits on a random fraction of each training fold.
+
+    Validation folds are left untouched, so scores of different fidelities
+    stay comparable while fitting costs only ``fraction`` of the rows.
+    """
+
+    def __init__(self, n_splits=3, fraction=1.0, shuffle=True, random_state=None):
+        super().__init__(n_splits=n_splits, shuffle=shuffle, random_state=random_state)
+        self.fraction = fraction
+
+    def split(self, X, y=None, groups=None):
+        rng = np.random.RandomState(self.random_state)
+        for train, test in super().split(X, y, groups):
+            if self.fraction < 1:
+                size = max(int(len(train) * self.fraction), min(len(train), MIN_ROWS))
+                train = np.sort(rng.choice(train, size=size, replace=False))
+            yield train, test
+
+def schedule(eta, min_fraction, min_folds, max_folds):
+    """(fraction, folds) per rung, growing by ``eta`` until full data and folds."""
+    rungs = max(1, math.ceil(round(math.log(1 / min_fraction, eta), 6)) + 1)
+    plan = []
+    for rung in range(rungs):
+        fraction = min(1.0, min_fraction * eta ** rung)
+        folds = round(min_folds + (max_folds - min_folds) * rung / max(1, rungs - 1))
+        plan.append((fraction, folds))
+    return plan
+
+def candidates(regression):
+    """Model ids ``compare_models`` would try with ``turbo=True``."""
+    models = regression.models(internal=True)
+    if 'Turbo' in models:
+        models = models[models['Turbo'].astype(bool)]
+    if 'Special' in models:
+        models = models[~models['Special'].astype(bool)]
+    return models.index.to_list()
+
+def successive_halving(regression, sort, eta=None, min_fraction=None, time_budget=None, model_timeout=None):
+    """Budgeted model selection.
+
+    All candidates are compared on a small fraction of the training rows with
+    few folds, the best ``1/eta`` survive into the next rung with ``eta`` times
+    more rows and more folds, up to the full data and the configured folds.
+    Candidates whose projected fit time for the next rung exceeds
+    ``model_timeout`` seconds are dropped, and no new rung is started once
+    ``time_budget`` seconds are spent.
+
+    Returns the id of the winning model, the leaderboard of the last rung, the
+    leaderboards of all rungs and the winner fitted on the training data if
+    the last rung ran on full data and folds (else ``None``).
+    """
+    eta = eta or int(os.environ.get('SELECTION_ETA', 3))
+    min_fraction = min_fraction or float(os.environ.get('SELECTION_MIN_FRACTION', 0.1))
+    time_budget = time_budget or float(os.environ.get('SELECTION_BUDGET', 0)) or None
+    model_timeout = model_timeout or float(os.environ.get('SELECTION_MODEL_TIMEOUT', 0)) or None
+
+    seed = regression.get_config('seed')
+    fold_generator = regression.get_config('fold_generator')
+    max_folds = fold_generator.get_n_splits()
+    plan = schedule(eta, min_fraction, min(3, max_folds), max_folds)
+    start = time.monotonic()
+
+    survivors = candidates(regression)
+    history = []
+
+    for rung, (fraction, folds) in enumerate(plan):
+        remaining = None if time_budget is None else max(time_budget - (time.monotonic() - start), 0)
+
+        # The full rung uses the setup folds, so its winner is a regular fit
+        full = fraction >= 1 and folds == max_folds
+        top = regression.compare_models(
+            include=survivors,
+            fold=fold_generator if full else SubsampledKFold(folds, fraction, random_state=seed),
+            sort=sort,
+            budget_time=None if remaining is None else remaining / 60,
+            errors='ignore',
+            verbose=False,
+        )
+        leaderboard = regression.pull()
+        history.append(leaderboard.assign(**{'Rung': rung + 1, 'Rows %': round(fraction * 100), 'Folds': folds}))
+
+        if rung == len(plan) - 1 or len(leaderboard) <= 1:
+            break
+        if time_budget is not None and time.monotonic() - start >= time_budget:
+            break
+
+        next_fraction, next_folds = plan[rung + 1]
+        keep = leaderboard.iloc[:max(1, math.ceil(len(leaderboard) / eta))]
+        if model_timeout is not None:
+            projected = keep['TT (Sec)'] * next_folds * next_fraction / fraction
+            keep = keep[projected <= model_timeout] if (projected <= model_timeout).any() else keep.iloc[:1]
+        survivors = keep.index.to_list()
+
+    model = top if full and top not in (None, []) else None
+    return leaderboard.index[0], leaderboard, pd.concat(history), model
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+import uuid
+
+from collections import OrderedDict
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from core.cache import CACHE_DIR
+from core.data import fingerprint
+from core.metrics import frame_size
+
+STORE_DIR = CACHE_DIR / 'datasets'
+
+class DatasetStore:
+    """Process-wide store holding one copy of every dataset, by content hash.
+
+    Datasets are written once as uncompressed Arrow IPC files and read back
+    memory-mapped, so numeric columns are backed by the page cache (shared
+    with job workers reading the same file) instead of the heap. Every
+    session gets the same dataframe; pandas copy-on-write (enabled in
+    ``server.py``) turns their slices into views that never write back.
+
+    Datasets unused for ``idle`` seconds, or beyond ``max_bytes`` in total,
+    are dropped from memory and reopened from disk on the next ``get``.
+    """
+
+    def __init__(self, root=STORE_DIR, max_bytes=None, idle=None, max_files=None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(float(os.environ.get('DATASET_STORE_MB', 4096)) * 1024**2)
+        self.idle = idle or float(os.environ.get('DATASET_IDLE_MINUTES', 60)) * 60
+        self.max_files = max_files or int(os.environ.get('DATASET_STORE_FILES', 20))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _file(self, key):
+        return self.root / f'{key}.arrow'
+
+    def _open(self, key):
+        with pa.memory_map(str(self._file(key)), 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+        # One block per column keeps zero-copy columns on the mapped pages
+        return table.to_pandas(split_blocks=True)
+
+    def dataset(self, key):
+        """Arrow dataset of ``key`` for scans that filter and select columns on the file."""
+        return ds.dataset(str(self._file(key)), format='arrow')
+
+    def put(self, df):
+        """Store ``df`` (unless already stored) and return its key."""
+        key = fingerprint(df)
+        path = self._file(key)
+
+        if not path.exists():
+            tmp = self.root / f'.{key}.{uuid.uuid4().hex[:8]}'
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pa.OSFile(str(tmp), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp, path)
+            self.prune()
+
+        self.get(key)
+        return key
+
+    def get(self, key):
+        """Shared dataframe of ``key``; ``None`` if it is not stored (anymore)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry['used'] = time.monotonic()
+                self._entries.move_to_end(key)
+                return entry['df']
+
+        if not self._file(key).exists():
+            return None
+
+        df = self._open(key)
+        self._file(key).touch()
+
+        with self._lock:
+            entry = self._entries.setdefault(key, {'df': df, 'bytes': frame_size(df)})
+            entry['used'] = time.monotonic()
+            self._entries.move_to_end(key)
+        self.evict()
+        return entry['df']
+
+    def evict(self):
+        """Drop idle datasets and the least recently used ones beyond ``max_bytes``."""
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if now - e['used'] > self.idle]:
+                del self._entries[key]
+            while len(self._entries) > 1 and sum(e['bytes'] for e in self._entries.values()) > self.max_bytes:
+                self._entries.popitem(last=False)
+
+    def prune(self):
+        """Delete the least recently used files beyond ``max_files``."""
+        files = sorted(self.root.glob('*.arrow'), key=lambda p: p.stat().st_mtime, reverse=True)
+        with self._lock:
+            for path in files[self.max_files:]:
+                if path.stem not in self._entries:
+                    path.unlink(missing_ok=True)
+
+    def stats(self):
+        with self._lock:
+            return {'datasets': len(self._entries), 'bytes': sum(e['bytes'] for e in self._entries.values())}
+
+dataset_store = DatasetStore()
@@ -0,0 +1,98 @@
+import os
+
+import pandas as pd
+
+from pycaret.regression import RegressionExperiment
+
+from core import parallel
+from core.cache import CACHE_DIR, FitCache, SetupCache
+from core.encoding import encoding_params, matrix_report
+
+setup_cache = SetupCache()
+fit_cache = FitCache()
+
+SETUP = dict(
+    session_id              = int(os.environ.get('RANDOM_SEED', 42)),
+    log_experiment          = False,
+    experiment_name         = "regression",
+    # Feature Engineering
+    create_date_columns     = ['year','month','week','weekday','hour'],
+    # Ausreißer entfernen
+    remove_outliers         = True,
+    outliers_method         = 'iforest',
+    # Missing values
+    numeric_imputation      = 'mean',
+    categorical_imputation  = 'mode',
+    normalize               = True,
+    normalize_method        = 'zscore',
+    # Train-Test Split
+    train_size              = 0.7,
+    # Training
+    fold                    = 10,
+    fold_strategy           = 'kfold',
+    # Parallel fold fits, see core.parallel
+    n_jobs                  = parallel.workers(),
+)
+
+def experiment(df, target, memory=CACHE_DIR / 'pipeline', encoding=None):
+    regression = RegressionExperiment()
+    regression.setup(
+        data                    = df,
+        target                  = target,
+        # Reuse fitted transformers across runs
+        memory                  = str(memory),
+        # One-hot or target/hashing encoding by cardinality
+        **(encoding_params(df, target) if encoding is None else encoding),
+        **SETUP
+    )
+    return regression
+
+def prepare(df, target):
+    """Set up an experiment, reusing a cached setup of the same data and config."""
+    encoding = encoding_params(df, target)
+    key = setup_cache.key(df, dict(SETUP, target=target, **encoding))
+    cached = setup_cache.load(key, df)
+    if cached is None:
+        regression = experiment(df, target, encoding=encoding)
+        overview = pd.concat([regression.pull(), matrix_report(regression, df, target)], ignore_index=True)
+        cached = setup_cache.store(key, regression, overview)
+    return cached
+
+def select_best(leaderboard):
+    """Best ranked model that trains faster than the average candidate."""
+    if len(leaderboard) > 1:
+        return leaderboard[leaderboard['TT (Sec)'] < leaderboard['TT (Sec)'].mean()].iloc[0].name
+    return leaderboard.iloc[0].name
+
+def _fold(regression, full):
+    return 'full' if full else repr(regression.get_config('fold_generator'))
+
+def fit(regression, estimator, dataset, full=False, cache=None):
+    """``create_model()`` through the fitted-estimator cache.
+
+    With ``full`` the estimator is refitted once on the complete data with
+    ``finalize_model()`` instead of being cross-validated; the results are
+    ``None`` then. ``cache`` replaces the shared ``fit_cache``. Returns the
+    fitted model and its CV results.
+    """
+    cache = cache or fit_cache
+    key = cache.key(estimator, dataset, _fold(regression, full))
+    cached = cache.load(key)
+    if cached is not None:
+        return cached
+
+    if full:
+        model, results = regression.finalize_model(estimator), None
+    else:
+        model = regression.create_model(estimator, verbose=False)
+        results = regression.pull()
+
+    cache.store(key, model, results)
+    return model, results
+
+def remember(regression, model_id, dataset, model, leaderboard):
+    """Cache a model fitted by ``compare_models()`` with its leaderboard scores."""
+    results = leaderboard.loc[[model_id]].drop(columns=['Model', 'TT (Sec)'], errors='ignore')
+    results.index = pd.Index(['Mean'], name='Fold')
+    fit_cache.store(fit_cache.key(model_id, dataset, _fold(regression, False)), model, results)
+    return results
@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import optuna
+
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from core import parallel
+
+SCORERS = {
+    'RMSE': (lambda y, p: np.sqrt(mean_squared_error(y, p)), 'minimize'),
+    'MSE': (mean_squared_error, 'minimize'),
+    'MAE': (mean_absolute_error, 'minimize'),
+    'R2': (r2_score, 'maximize'),
+}
+
+PRUNERS = {
+    'asha': lambda folds: optuna.pruners.SuccessiveHalvingPruner(),
+    'hyperband': lambda folds: optuna.pruners.HyperbandPruner(min_resource=1, max_resource=folds),
+    'median': lambda folds: optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1),
+}
+
+def search_space(regression, model_id):
+    """Optuna distributions of PyCaret's tuning space for ``model_id``."""
+    from pycaret.internal.distributions import get_optuna_distributions
+
+    models = regression.models(internal=True)
+    if 'Tune Distributions' not in models or model_id not in models.index:
+        return {}
+    return get_optuna_distributions(models.loc[model_id, 'Tune Distributions'] or {})
+
+def fit(model, X_train, y_train, X_valid, y_valid, rounds):
+    """Fit ``model``; boosted trees stop early on the validation fold.
+
+    Returns the number of boosting rounds used or ``None``.
+    """
+    name = type(model).__name__
+
+    if name == 'LGBMRegressor':
+        import lightgbm
+        model.fit(X_train, y_train, eval_set=[(X_valid, y_valid)],
+                  callbacks=[lightgbm.early_stopping(rounds, verbose=False)])
+        return model.best_iteration_ or None
+    if name == 'XGBRegressor':
+        model.set_params(early_stopping_rounds=rounds)
+        model.fit(X_train, y_train, eval_set=[(X_valid, y_valid)], verbose=False)
+        return model.best_iteration + 1
+    if name == 'CatBoostRegressor':
+        model.fit(X_train, y_train, eval_set=(X_valid, y_valid), early_stopping_rounds=rounds, verbose=False)
+        return model.get_best_iteration() + 1
+
+    model.fit(X_train, y_train)
+    return None
+
+def tune(regression, estimator, model_id, X, y, optimize, n_trials=50, time_budget=None,
+         pruner='asha', n_jobs=None, early_stopping_rounds=50):
+    """Multi-fidelity hyperparameter search with trial pruning.
+
+    Trials are sampled by TPE from PyCaret's tuning space and evaluated fold
+    by fold on the transformed training matrix ``X``/``y``. After every fold
+    the running mean score is reported, so the pruner stops unpromising
+    trials after one or two folds. Boosted trees additionally stop early
+    within each fold. Trials run in ``n_jobs`` threads (with single threaded
+    estimators) until ``n_trials`` are done or ``time_budget`` seconds passed.
+
+    Returns the untrained estimator with the best parameters (or ``None`` if
+    there is no tuning space for the model) and the trials as dataframe.
+    """
+    space = search_space(regression, model_id)
+    if not space:
+        return None, None
+
+    score, direction = SCORERS[optimize]
+    folds = list(regression.get_config('fold_generator').split(X, y))
+    n_jobs = n_jobs or int(os.environ.get('TUNE_JOBS', 0)) or parallel.workers()
+    seed = regression.get_config('seed')
+
+    base = clone(estimator)
+    if n_jobs > 1:
+        # Parallelism comes from concurrent trials, avoid oversubscription
+        for param in ('n_jobs', 'thread_count'):
+            if param in base.get_params():
+                base.set_params(**{param: 1})
+
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.create_study(
+        direction=direction,
+        sampler=optuna.samplers.TPESampler(seed=seed),
+        pruner=PRUNERS[pruner](len(folds)),
+    )
+
+    def objective(trial):
+        scores, rounds = [], []
+        for step, (train, valid) in enumerate(folds):
+            model = clone(base).set_params(**trial.params)
+            used = fit(model, X[train], y[train], X[valid], y[valid], early_stopping_rounds)
+            if used is not None:
+                rounds.append(used)
+            scores.append(score(y[valid], model.predict(X[valid])))
+
+            trial.report(float(np.mean(scores)), step)
+            if trial.should_prune():
+                raise optuna.TrialPruned()
+
+        if rounds:
+            trial.set_user_attr('n_estimators', int(np.mean(rounds)))
+        return float(np.mean(scores))
+
+    deadline = None if not time_budget else time.monotonic() + time_budget
+    started = [0]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if started[0] >= n_trials or (deadline is not None and time.monotonic() >= deadline):
+                    return
+                started[0] += 1
+            trial = study.ask(space)
+            try:
+                value = objective(trial)
+            except optuna.TrialPruned:
+                study.tell(trial, state=optuna.trial.TrialState.PRUNED)
+            except Exception:
+                study.tell(trial, state=optuna.trial.TrialState.FAIL)
+            else:
+                study.tell(trial, value)
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        for _ in range(n_jobs):
+            executor.submit(worker)
+
+    complete = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+    if not complete:
+        return None, study.trials_dataframe()
+
+    params = dict(study.best_params)
+    if 'n_estimators' in study.best_trial.user_attrs:
+        params['n_estimators'] = study.best_trial.user_attrs['n_estimators']
+
+    return clone(estimator).set_params(**params), study.trials_dataframe()
@@ -0,0 +1,53 @@
+import importlib
+import os
+import threading
+import time
+
+# Heavy modules only some pages and functions need, loaded lazily there
+MODULES = [
+    'pycaret.regression',
+    'sklearn.inspection',
+    'lightgbm',
+    'xgboost',
+    'catboost',
+    'optuna',
+    'ydata_profiling',
+]
+
+_lock = threading.Lock()
+_started = False
+
+timings = {}
+
+def enabled():
+    return os.environ.get('PRELOAD_IMPORTS', 'true').lower() == 'true'
+
+def _preload(modules, delay):
+    # Give the first page time to render before competing for the GIL
+    time.sleep(delay)
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception:
+            continue
+        timings[name] = time.perf_counter() - started
+
+def start(modules=MODULES, delay=None):
+    """Import ``modules`` in a background thread, once per process.
+
+    Pages import what they need on first use anyway; this only moves the
+    cost out of the first click on a training, prediction or deployment
+    page. Disabled with ``PRELOAD_IMPORTS=false``.
+    """
+    global _started
+
+    if not enabled():
+        return
+    with _lock:
+        if _started:
+            return
+        _started = True
+
+    delay = float(os.environ.get('PRELOAD_DELAY', 1)) if delay is None else delay
+    threading.Thread(target=_preload, args=(modules, delay), daemon=True).start()
@@ -1,11 +1,19 @@
-import pycaret
 import os
 
 import streamlit as st
 import base64
 import numpy as np
+import pandas as pd
 from st_pages import add_page_title, get_nav_from_toml
 
+from core import warmup
+from core.jobs import JOB_DIR, Job
+from core.metrics import MB, frame_size, peak_rss, rss
+from core.store import dataset_store
+
+# Sessions share the dataframes of the dataset store, slices must never write back
+pd.set_option('mode.copy_on_write', True)
+
 @st.cache_data
 def get_base64_of_bin_file(png_file):
     with open(png_file, "rb") as f:
@@ -97,12 +105,18 @@ st.markdown(
 
 add_logo("src/_static/images/logo.svg")
 
+# Dataset removed from the store (e.g. cache cleared), start over
+if 'dataset' in st.session_state and dataset_store.get(st.session_state.dataset) is None:
+    for key in ('dataset', 'target', 'eda', 'reg', 'api', 'deployed', 'sample_size'):
+        st.session_state.pop(key, None)
+    st.toast("The dataset is no longer available, please upload it again.")
+
 with st.sidebar:
     progress_text = "Tasks completed"
 
     my_bar = st.progress(0, text=progress_text)
 
-    if 'df' in st.session_state:
+    if 'dataset' in st.session_state:
         my_bar.progress(0.25, text=progress_text)
     
     if 'eda' in st.session_state:
@@ -114,9 +128,27 @@ with st.sidebar:
     if 'api' in st.session_state:
         my_bar.progress(100, text=progress_text)
 
+    with st.expander("Resources"):
+        session_mb = sum(frame_size(v) for v in st.session_state.values() if isinstance(v, pd.DataFrame)) / MB
+        store = dataset_store.stats()
+        st.caption(f"Server memory: {(rss() or 0) / MB:,.0f} MB (peak {peak_rss() / MB:,.0f} MB)")
+        st.caption(f"Shared datasets: {store['datasets']} ({store['bytes'] / MB:,.1f} MB)")
+        st.caption(f"Session data: {session_mb:,.1f} MB")
+
+        if 'job' in st.session_state and (JOB_DIR / st.session_state.job).exists():
+            totals = Job(JOB_DIR / st.session_state.job).log.totals()
+            if totals:
+                st.dataframe(
+                    pd.DataFrame(totals).T.rename(columns={'seconds': 'Seconds', 'peak_delta_mb': 'Peak +MB'}).round(1),
+                    use_container_width=True
+                )
+
 # Fixed Random seed
 np.random.seed(int(os.environ.get("RANDOM_SEED")))
 
+# Preload the ML stack in the background once the first page is served
+warmup.start()
+
 # Pages
 nav = get_nav_from_toml(".streamlit/pages.toml")
 pg = st.navigation(nav)
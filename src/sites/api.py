@@ -3,56 +3,100 @@ import streamlit as st
 import datetime as dt
 
 from dotenv import load_dotenv
-from zipfile import ZipFile
-from pycaret.regression import *
 
-load_dotenv()
+from core import explain
+from core.build import build_store
+from core.registry import ModelRegistry
+from core.store import dataset_store
+from core.deployment import (
+    BATCH_MAX_ROWS, BATCH_WINDOW_MS, CACHE_SIZE, CACHE_TTL, CHUNK_ROWS, MAX_BATCH_ROWS, MAX_EXPLAIN_ROWS, build_deployment,
+    throughput
+)
 
-st.title("⚙️ Deploy API")
+load_dotenv()
 
-if "reg" in st.session_state:
-    with st.spinner("Init api..."):
-        model = st.session_state.reg.load_model('./src/_static/model/deployed_model')
-        name = st.session_state.target.lower().replace('.','_') + "_api"
-        st.session_state.reg.create_api(
-            model, f'./src/api/{name}',
-            host=os.environ.get('API_HOST'),
-            port=int(os.environ.get('API_PORT'))
-        )
+@st.cache_data
+def get_throughput(_df, dataset, target, model):
+    return throughput(ModelRegistry().load(model), _df.drop(columns=target))
 
-        # Fix "Timestamp" error: Timestamp -> pd.Timestamp
+@st.cache_data(max_entries=4)
+def get_archive(key):
+    return build_store.archive(key)
 
-        # Read in the file
-        with open(f'./src/api/{name}.py', 'r') as file:
-            filedata = file.read()
+@st.fragment(run_every=1)
+def wait_for_build(key):
+    if build_store.status(key)[0] != 'running':
+        st.rerun()
+    st.info("Building API and Docker files in the background...")
 
-        # Replace the target string
-        filedata = filedata.replace('Timestamp(', 'pd.Timestamp(')
+st.title("⚙️ Deploy API")
 
-        # Write the file out again
-        with open(f'./src/api/{name}.py', 'w') as file:
-            file.write(filedata)
+if "reg" in st.session_state:
+    df = dataset_store.get(st.session_state.dataset)
+
+    mode = st.radio(
+        "Model artifact",
+        ('pipeline', 'compiled'),
+        format_func=lambda x: {
+            'pipeline': 'PyCaret pipeline (pickle)',
+            'compiled': 'Compiled (pipeline-free, no PyCaret at runtime)',
+        }[x],
+        horizontal=True
+    )
+
+    name = st.session_state.target.lower().replace('.','_') + "_api"
+    host, port = os.environ.get('API_HOST'), int(os.environ.get('API_PORT'))
+
+    # Files are only built again if one of their inputs changed
+    # Read once, the alias may point to another model when the build runs
+    model = ModelRegistry().version('deployed')['id']
+    key = build_store.key(
+        model=model, dataset=st.session_state.dataset,
+        mode=mode, name=name, host=host, port=port
+    )
+    state, info = build_store.status(key)
+
+    if state == 'missing':
+        regression, target = st.session_state.reg, st.session_state.target
+        build_store.submit(key, lambda path: build_deployment(
+            path, regression, ModelRegistry().load(model), df.drop(columns=target), name, host, port, mode))
+        state = 'running'
+
+    if state == 'running':
+        wait_for_build(key)
+    elif state == 'failed':
+        st.error(f"Building the deployment failed: {info}")
+        st.button("Retry", on_click=build_store.forget, args=(key,))
+    else:
+        if mode == 'compiled':
+            check = info['parity']
+            if info['error'] is not None:
+                st.warning(f"{info['error']} Serving the PyCaret pipeline instead.")
+            elif info['mode'] == 'compiled':
+                st.info(
+                    f"Compiled model matches `predict_model` on {check['rows']} rows "
+                    f"(max. difference {check['max_abs_diff']:.1e}). "
+                    f"Size: {info['size'] / 1024**2:,.2f} MB instead of "
+                    f"{ModelRegistry().path(model).stat().st_size / 1024**2:,.2f} MB."
+                )
+            else:
+                st.warning(
+                    f"Compiled model deviates from `predict_model` by up to {check['max_abs_diff']:.1e}. "
+                    "Serving the PyCaret pipeline instead."
+                )
 
-        st.session_state.reg.create_docker(f'./src/api/{name}')
-    
         st.session_state.api = 'Deployed'
         st.success('Create API and Docker files. Finished API deployment!')
 
     st.markdown(f'''
     ### Step 1: Start API
 
-    To start API, run the following command:
+    Unpack the deployment files and run the following command in their directory:
 
     ```shell
-    python ./src/api/baggage_preview_api.py
+    python {name}.py
     ```
 
-    or in pipenv environment:
-    
-    ```shell
-    python -m pipenv run api
-    ```
-                
     or build Docker image and run as container:
 
     ```shell
@@ -61,18 +105,12 @@ if "reg" in st.session_state:
     ```
     ''')
 
-    zipFile = f"{name}_{dt.datetime.today().strftime('%Y%m%d%H%M%S')}.zip"
-    with ZipFile('deployment.zip', mode='w') as f:
-        f.write('Dockerfile')
-        f.write(f'./src/api/{name}.py')
-        f.write(f'./src/api/{name}.pkl')
-
-    with open("deployment.zip", "rb") as fp:
+    if state == 'done':
         st.download_button(
             "⬇️ Download deployment files",
-            data=fp,
+            data=get_archive(key),
             mime='application/zip',
-            file_name=zipFile
+            file_name=f"{name}_{dt.datetime.today().strftime('%Y%m%d%H%M%S')}.zip"
         )
 
     st.markdown(f'''
@@ -84,7 +122,7 @@ if "reg" in st.session_state:
 
     ''')
 
-    sample = st.session_state.df.sample(1)
+    sample = df.sample(1)
     feature = sample[st.session_state.target].values[0]
     json = sample.drop(columns=st.session_state.target).to_dict('records')[0]
     st.json(json)
@@ -95,6 +133,62 @@ if "reg" in st.session_state:
         "prediction" : feature
     })
 
+    st.markdown(f'''
+    Concurrent requests are predicted together: requests arriving within {BATCH_WINDOW_MS} ms, up to {BATCH_MAX_ROWS} rows,
+    share one prediction. Predictions are cached for {CACHE_TTL} seconds ({CACHE_SIZE:,} entries).
+    Tune this with the environment variables `BATCH_WINDOW_MS`, `BATCH_MAX_ROWS`, `CACHE_TTL` and `CACHE_SIZE` (`0` disables the cache).
+    ''')
+
+    st.markdown(f'''
+    ### Step 3: Batch predictions
+
+    To score many rows at once, POST an Arrow IPC stream, a Parquet file or newline delimited JSON
+    to `/predict/batch` and set the `Content-Type` header to `application/vnd.apache.arrow.stream`,
+    `application/vnd.apache.parquet` or `application/x-ndjson`. Predictions are streamed back in input order,
+    in the same format or in the one requested with the `Accept` header.
+
+    A batch may contain up to **{MAX_BATCH_ROWS:,}** rows, which are predicted in chunks of {CHUNK_ROWS:,} rows.
+    ''')
+
+    with st.spinner("Measure throughput..."):
+        rows, rate = get_throughput(df, st.session_state.dataset, st.session_state.target, model)
+
+    st.write(f"Throughput of the model on this server: about **{rate:,.0f} rows/s** (batch of {rows:,} rows, without network transfer).")
+
+    st.code(f'''
+import pandas as pd
+import pyarrow as pa
+import requests
+
+df = pd.read_parquet("data.parquet")
+
+sink = pa.BufferOutputStream()
+table = pa.Table.from_pandas(df, preserve_index=False)
+with pa.ipc.new_stream(sink, table.schema) as writer:
+    writer.write_table(table)
+
+response = requests.post(
+    "http://{os.environ.get('API_HOST')}:{os.environ.get('API_PORT')}/predict/batch",
+    data=sink.getvalue().to_pybytes(),
+    headers={{"Content-Type": "application/vnd.apache.arrow.stream"}},
+)
+predictions = pa.ipc.open_stream(response.content).read_pandas()
+''', language='python')
+
+    st.code(f'''
+curl -X POST 'http://{os.environ.get('API_HOST')}:{os.environ.get('API_PORT')}/predict/batch' \\
+     -H 'Content-Type: application/x-ndjson' --data-binary @data.ndjson
+''', language='shell')
+
+    st.markdown(f'''
+    ### Step 4: Explain predictions
+
+    POST one row or a JSON list of up to **{MAX_EXPLAIN_ROWS:,}** rows (or a batch as for `/predict/batch`)
+    to `/explain`. For every row, the response contains the prediction, the average prediction (`base_value`)
+    and the SHAP contribution of every column. Tree models are explained exactly with TreeSHAP, other models
+    against a sample of {explain.BACKGROUND_ROWS} training rows. Set `MAX_EXPLAIN_ROWS` to change the limit.
+    ''')
+
     st.divider()
 
     st.link_button("🗒️ Open documentation", "http://" + os.environ.get('API_HOST')+":"+os.environ.get('API_PORT')+"/docs")
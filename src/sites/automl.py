@@ -3,182 +3,338 @@ import os
 import streamlit as st
 
 from dotenv import load_dotenv
-from pycaret.regression import *
-from streamlit_shap import st_shap
+
+from core import sampling
+from core.store import dataset_store
+from core.jobs import ACTIVE, RETRAIN_STAGES, STAGES, Job, JobManager
+from core.registry import ModelRegistry
 
 load_dotenv()
 
-def experiment(df, target):
-    regression = RegressionExperiment()
-    regression.setup(
-        session_id              = 42,
-        data                    = df,
-        log_experiment          = False,
-        experiment_name         = "regression",
-        target                  = target,
-        # Feature Engineering
-        create_date_columns     = ['year','month','week','weekday','hour'],
-        # Ausreißer entfernen
-        remove_outliers         = True,
-        outliers_method         = 'iforest',
-        # Missing values
-        numeric_imputation      = 'mean',
-        categorical_imputation  = 'mode',
-        normalize               = True,
-        normalize_method        = 'zscore',
-        # One-Hot-Encoding
-        max_encoding_ohe        = 1000,
-        # Train-Test Split
-        train_size              = 0.7,
-        # Training
-        fold                    = 10,
-        fold_strategy           = 'kfold',
-    )
-    return regression
-
-def generate_performance(regression, best_model_name):
-    print("Generate plots")
-    metrics = regression.pull().loc['Mean']
-    residuals = regression.plot_model(best, plot = 'residuals', save='./src/_static/images/plots/')
-    errors = regression.plot_model(best, plot = 'error', save='./src/_static/images/plots/')
-    feature_all = regression.plot_model(best, plot = 'feature_all', save='./src/_static/images/plots/')
-    learning = regression.plot_model(best, plot = 'learning', save='./src/_static/images/plots/')
-    interpret = regression.interpret_model(best, plot = 'pfi', save = './src/_static/images/plots/')
-
-    return metrics, residuals, errors, feature_all, learning, interpret
+STAGE_LABELS = {
+    'sample': 'Find sample size',
+    'setup': 'Prepare training',
+    'compare': 'Compare models with sample',
+    'train': 'Train best model',
+    'tune': 'Boosting model (optimization)',
+    'performance': 'Generate performance metrics',
+    'finalize': 'Train final model',
+    'drift': 'Check new data for drift',
+    'retrain': 'Update model with new data',
+    'export': 'Save updated model',
+}
+
+@st.cache_resource
+def get_job_manager():
+    """One job queue per server process, shared by all sessions."""
+    return JobManager()
+
+@st.cache_resource(max_entries=4)
+def get_experiment(path):
+    """Experiment of a finished job, one instance shared by all sessions."""
+    from pycaret.regression import load_experiment
+
+    job = Job(path)
+    return load_experiment(str(job.path / 'experiment.pkl'), data=job.data, preprocess_data=False)
+
+def deploy_button(job, model_id, model_name, metrics):
+    def click_button():
+        st.session_state.saved = True
+        st.session_state.deployed = True
+        st.session_state.reg = get_experiment(str(job.path))
+        st.session_state.best = job.deployable
+        st.session_state.best_name = model_id
+        st.session_state.best_meta = {
+            'model': model_name,
+            'target': job.params['target'],
+            'dataset': job.params['dataset'],
+            'job': job.id,
+            'metrics': {name: round(float(value), 4) for name, value in metrics.items()},
+        }
+
+    st.button("Deploy model", type="primary", on_click=click_button)
+
+def show_retrain_results(job):
+    st.subheader("Step 1: Check new data")
+
+    checked = job.result('drift')
+    st.write(f"{checked['new_rows']} new rows since the current model was trained.")
+
+    if checked['drift'] is not None:
+        with st.expander("Drift per column (PSI)"):
+            st.dataframe(checked['drift'], use_container_width=True, hide_index=True)
+
+    st.success(f"No relevant drift: {checked['reason']}")
+
+    st.subheader("Step 2: Update model")
+
+    updated = job.result('retrain')
+    st.write({
+        'warm start': "Continued training of the boosted model with the new rows.",
+        'refit': "Refitted the model on all rows with the existing preprocessing.",
+        'kept': "The updated model was worse on held out new rows, the current model is kept.",
+        'unchanged': "No new rows, the current model is kept.",
+    }[updated['method']])
+
+    scores = updated['scores']
+    if scores is not None:
+        st.dataframe(scores, use_container_width=True)
+
+    st.success("Updated model!")
+
+    st.subheader("Step 3: Deploy model")
+
+    exported = job.result('export')
+    deploy_button(job, exported['model_id'], exported['model_name'], exported['metrics'])
+
+def show_results(job):
+    st.subheader("Step 1: Find best model")
+
+    with st.expander("Experimental overview"):
+        st.dataframe(job.result('setup')['overview'], use_container_width=True, hide_index=True)
+
+    if job.done('sample'):
+        chosen = job.result('sample')
+        st.write(f"Find best model with sample of {chosen['size']} rows, chosen automatically.")
+        if chosen['curve'] is not None:
+            with st.expander("Learning curve"):
+                st.dataframe(chosen['curve'], use_container_width=True, hide_index=True)
+    else:
+        st.write(f"Find best model with sample of {job.params['sample_size']} rows.")
 
-st.title("🤖 Training with AutoML")
+    compared = job.result('compare')
+    best_model_name = compared['best_model_name']
 
-if 'df' in st.session_state and 'target' in st.session_state:
+    st.markdown("**Results:**")
+    st.dataframe(compared['leaderboard'], use_container_width=True, hide_index=True)
 
-    if 'deployed' not in st.session_state:
+    if 'rungs' in compared:
+        with st.expander("Successive halving rounds"):
+            st.dataframe(compared['rungs'], use_container_width=True, hide_index=True)
 
-        st.subheader("Step 1: Find best model")
+    st.success(f"Best model: {compared['leaderboard'].loc[best_model_name, 'Model']}")
 
-        df = st.session_state.df.sample(st.session_state.sample_size)
-        target = st.session_state.target
+    st.subheader("Step 2: Train best model")
 
-        metric = None
-        metric_input = st.selectbox('What do you want to optimize?',
-            ('Low error','High correlation'), index=None)
+    st.write("Train best model with full data.")
 
-        if metric_input == 'Low error':
-            metric = 'RMSE'
-        elif metric_input == 'High correlation':
-            metric = 'R2'
+    with st.expander("Experimental overview"):
+        st.dataframe(job.result('train')['results'], use_container_width=True, hide_index=True)
 
-        if metric is not None:
+    st.success("Finished training best model!")
 
-            if st.session_state.target:
-                with st.spinner('Prepare first training...'):
-                    regression = experiment(df, target)
+    st.subheader(f"Step 3: Tune best model. This may take a few minutes.")
 
-                with st.expander("Experimental overview"):
-                    st.dataframe(regression.pull(), use_container_width=True, hide_index=True)
+    tuned = job.result('tune')
+    st.dataframe(tuned['results'], use_container_width=True)
 
-            st.write(f"Find best model with sample of {st.session_state.sample_size} rows.")
-            
-            with st.spinner("Compare models with sample..."):
-                best = regression.compare_models(sort=metric)
+    if tuned.get('trials') is not None:
+        trials = tuned['trials']
+        with st.expander(f"Trials ({(trials['state'] == 'PRUNED').sum()} of {len(trials)} stopped early)"):
+            st.dataframe(trials, use_container_width=True, hide_index=True)
 
-            st.markdown("**Results:**")
+    st.success(f"Tuned best model!")
 
-            leaderboard = regression.pull()
-            st.dataframe(leaderboard, use_container_width=True, hide_index=True)
+    st.subheader("Step 4: Model performance")
 
-            st.success(f"Best model: {best}")
+    performance = job.result('performance')
 
-            st.subheader("Step 2: Train best model")
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Metrics", "Residuals", "Erros", "Learning", "Feature Importance", "Interpret"])
 
-            st.write("Train best model with full data.")
+    with tab1:
+        cols = st.columns(3)
+        for index, (name, value) in enumerate(zip(performance['metrics'].index, performance['metrics'].to_numpy())):
+            with cols[index % 3]:
+                st.metric(label=name, value=value)
 
-            with st.spinner("Train final model with all data..."):
+    with tab2:
+        st.image(performance['residuals'])
 
-                with st.expander("Experimental overview"):
-                    st.dataframe(regression.pull(), use_container_width=True, hide_index=True)
+    with tab3:
+        st.image(performance['errors'])
 
-                if len(leaderboard) > 1:
-                    best_model_name = leaderboard[leaderboard['TT (Sec)'] < leaderboard['TT (Sec)'].mean()].iloc[0].name
-                else:
-                    best_model_name = leaderboard.iloc[0].name
+    with tab4:
+        st.image(performance['learning'])
 
-                best = regression.create_model(best_model_name)
+    with tab5:
+        st.image(performance['feature_all'])
 
-                st.success("Finished training best model!")
+    with tab6:
+        st.image(performance['interpret'])
+        st.dataframe(performance['importance'], use_container_width=True, hide_index=True)
 
-            st.subheader(f"Step 3: Tune best model. This may take a few minutes.")
+    st.subheader("Step 5: Finalize model")
 
-            with st.spinner("Boosting model (optimization)..."):
-                best = regression.tune_model(
-                    best,
-                    n_iter=50,
-                    optimize = metric,
-                    return_tuner= False,
-                    choose_better = True
-                )
+    st.success(f"Finalized best model!")
 
-            st.dataframe(regression.pull(), use_container_width=True)
-            
-            st.success(f"Tuned best model!")
+    st.subheader("Step 6: Deploy model")
 
-            st.subheader("Step 4: Model performance")
+    deploy_button(job, best_model_name, compared['leaderboard'].loc[best_model_name, 'Model'], performance['metrics'])
 
-            with st.spinner("Generate performance metrics..."):
-                metrics, residuals, errors, feature_all, learning, interpret = generate_performance(regression, best_model_name)
+@st.fragment(run_every=2)
+def show_progress(job):
+    status = job.status
 
-            tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Metrics", "Residuals", "Erros", "Learning", "Feature Importance", "Interpret"])
+    if status['state'] == 'queued':
+        st.info("Training is queued and starts as soon as a worker is free.")
+    elif status['stage'] is not None:
+        stages = RETRAIN_STAGES if status['stage'] in RETRAIN_STAGES else STAGES
+        st.progress(
+            status['progress'],
+            text=f"Step {stages.index(status['stage']) + 1}/{len(stages)}: {STAGE_LABELS[status['stage']]}..."
+        )
 
-            with tab1:
-                index = 0
-                col1, col2, col3 = st.columns(3)
-                for name, value in zip(metrics.index, metrics.to_numpy()):
-                    with globals()[f"col{(index%3)+1}"]:
-                        st.metric(label=name, value=value)
-                        index += 1
+    if status['state'] not in ACTIVE:
+        st.rerun()
 
-            with tab2:
-                st.image(residuals)
+st.title("🤖 Training with AutoML")
 
-            with tab3:
-                st.image(errors)
+if 'dataset' in st.session_state and 'target' in st.session_state:
 
-            with tab4:
-                st.image(learning)
+    if 'deployed' not in st.session_state:
 
-            with tab5:
-                st.image(feature_all)
+        manager = get_job_manager()
+        target = st.session_state.target
 
-            with tab6:
-                st.write("Permutation Feature Importance")
-                st.write(interpret)
+        metric = None
+        metric_input = st.selectbox('What do you want to optimize?',
+            ('Low error','High correlation'), index=None)
 
-            st.subheader("Step 5: Finalize model")
+        if metric_input == 'Low error':
+            metric = 'RMSE'
+        elif metric_input == 'High correlation':
+            metric = 'R2'
 
-            with st.spinner('Train final model...'):
-                best = regression.create_model(best_model_name)
-                st.success(f"Finalized best model!")
+        with st.expander("Model search"):
+            search = st.radio(
+                "Strategy",
+                ('budgeted', 'exhaustive'),
+                format_func=lambda x: {
+                    'budgeted': 'Budgeted (successive halving on growing samples)',
+                    'exhaustive': 'Exhaustive (all models with all folds)',
+                }[x],
+                horizontal=True
+            )
+            budget = st.number_input(
+                "Time budget in minutes (0 = unlimited)",
+                value=0, min_value=0, step=1,
+                disabled=search != 'budgeted'
+            )
 
-            st.subheader("Step 6: Deploy model")
+        with st.expander("Tuning"):
+            tuner = st.radio(
+                "Strategy",
+                ('pruned', 'random'),
+                format_func=lambda x: {
+                    'pruned': 'Pruned (stop bad trials after few folds)',
+                    'random': 'Random search (all trials with all folds)',
+                }[x],
+                horizontal=True
+            )
+            tune_budget = st.number_input(
+                "Tuning time budget in minutes (0 = unlimited)",
+                value=0, min_value=0, step=1,
+                disabled=tuner != 'pruned'
+            )
 
-            def click_button():
-                st.session_state.saved = True
-                st.session_state.deployed = True
-                st.session_state.reg = regression
-                st.session_state.best = best
-                st.session_state.best_name = best_model_name
+        # A finished training of an earlier version of the data can be updated
+        bases = [
+            job for job in manager.jobs()
+            if job.state == 'done' and job.params.get('dataset') != st.session_state.dataset
+            and job.params.get('target') == target and job.params.get('metric') == metric
+        ] if metric is not None else []
+        base = bases[-1] if bases else None
+
+        mode = 'full'
+        if base is not None:
+            # Start on the mode of the latest training of this data, so it is shown again
+            latest = manager.find(dataset=st.session_state.dataset, target=target, metric=metric)
+            mode = st.radio(
+                "Training mode",
+                ('incremental', 'full'),
+                index=1 if latest is not None and not latest.params.get('base') else 0,
+                format_func=lambda x: {
+                    'incremental': f"Incremental (update the model trained on {base.status.get('created', '')[:16]} with the new rows)",
+                    'full': 'Full (search and train a new model)',
+                }[x],
+                horizontal=True
+            )
 
-            st.button("Deploy model", type="primary", on_click=click_button)
+        if metric is not None:
+            params = {
+                'dataset': st.session_state.dataset,
+                'target': target,
+                'metric': metric,
+                'sample_size': None if st.session_state.sample_size is None else int(st.session_state.sample_size),
+                'search': search,
+                'budget': budget * 60 if search == 'budgeted' and budget > 0 else None,
+                'tuner': tuner,
+                'tune_budget': tune_budget * 60 if tuner == 'pruned' and tune_budget > 0 else None,
+                'base': base.id if mode == 'incremental' else None,
+            }
+
+            # Reattach to a running or finished training of the same data and settings
+            job = manager.find(**params)
+            if job is None and params['base'] and 'job' in st.session_state:
+                # Trained on an older base, which is not the latest finished training anymore
+                previous = manager.job(st.session_state.job)
+                if previous.params.get('base') and all(
+                        previous.params.get(k) == v for k, v in params.items() if k != 'base'):
+                    job = previous
+            if job is not None:
+                st.session_state.job = job.id
+
+            if job is None:
+                if params['base']:
+                    st.write("The model is updated in the background, unless the new data drifted too much.")
+                elif params['sample_size'] is None:
+                    st.write("Training runs in the background and starts with finding the smallest sample that trains as well as more rows.")
+                else:
+                    st.write(f"Training runs in the background with a sample of {st.session_state.sample_size} rows.")
+
+                if st.button("Start training", type="primary"):
+                    full = dataset_store.get(st.session_state.dataset)
+                    # Incremental training needs every row to find the new ones
+                    df = full if params['base'] else sampling.sample(full, target, params['sample_size'], st.session_state.dataset)
+                    manager.submit(df, full=full, **params)
+                    st.rerun()
+
+            elif job.state in ACTIVE:
+                show_progress(job)
+                st.button("Cancel training", on_click=manager.cancel, args=(job.id,))
+
+            elif job.state in ('interrupted', 'cancelled', 'failed'):
+                if job.state == 'interrupted':
+                    st.warning("Training was interrupted by a server restart.")
+                elif job.state == 'cancelled':
+                    st.info("Training was cancelled.")
+                else:
+                    st.error(f"Training failed: {job.status.get('error')}")
+
+                # Finished steps are kept, resuming continues with the next one
+                col1, col2 = st.columns(2)
+                with col1: st.button("Resume training", type="primary", on_click=manager.resume, args=(job.id,), use_container_width=True)
+                with col2: st.button("Discard", on_click=manager.delete, args=(job.id,), use_container_width=True)
+
+            elif job.state == 'done':
+                if job.done('compare'):
+                    if job.done('drift'):
+                        st.warning(f"The new data drifted ({job.result('drift')['reason']}), a new model was trained.")
+                    show_results(job)
+                else:
+                    show_retrain_results(job)
 
     else:
 
         if "saved" in st.session_state:
             st.balloons()
-            st.session_state.reg.save_model(st.session_state.best, './src/_static/model/deployed_model')
+            ModelRegistry().register(f'{st.session_state.best}.pkl', alias='deployed', **st.session_state.best_meta)
             st.success("Successfully saved model.")
 
             # Clean up session_state
             del st.session_state.saved
             del st.session_state.best
+            del st.session_state.best_meta
         else:
             st.info("Model already saved.")
 
@@ -201,7 +357,7 @@ if 'df' in st.session_state and 'target' in st.session_state:
             )
 
         with right_col:
-            with open('./src/_static/model/deployed_model.pkl', "rb") as fp:
+            with open(ModelRegistry().path('deployed'), "rb") as fp:
                 st.download_button(
                     "⬇️ Download model",
                     data=fp,
@@ -210,4 +366,4 @@ if 'df' in st.session_state and 'target' in st.session_state:
                 )
 
 else:
-    st.warning("You've to upload and prepare a dataframe first.")
\ No newline at end of file
+    st.warning("You've to upload and prepare a dataframe first.")
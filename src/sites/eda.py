@@ -3,13 +3,27 @@ import os
 import plotly.express as px
 import streamlit as st
 
-from ydata_profiling import ProfileReport
 from dotenv import load_dotenv
 
-@st.cache_data
-def generate_profile():
+from core import sampling
+from core.eda import column_stats, overview
+from core.store import dataset_store
+
+@st.cache_data(max_entries=1000)
+def get_overview(_df, dataset):
+    return overview(_df)
+
+@st.cache_data(max_entries=1000)
+def get_column_stats(_df, dataset, column):
+    """Statistics of one column, cached per dataset fingerprint and column."""
+    return column_stats(_df[column])
+
+@st.cache_data(max_entries=5)
+def generate_profile(_df, dataset, target, sample_size):
+    from ydata_profiling import ProfileReport
+
     pr = ProfileReport(
-        st.session_state.df.sample(st.session_state.sample_size),
+        sampling.sample(_df, target, sample_size, dataset),
         samples=None,
         correlations=None,
         missing_diagrams=None,
@@ -17,21 +31,50 @@ def generate_profile():
         interactions=None,
     )
     pr.config.html.style.primary_colors = ['#DA1C30']
-    return pr
+    return pr.to_html()
+
+def render_column(df, dataset, column):
+    kind, stats, distribution = get_column_stats(df, dataset, column)
+
+    col1, col2 = st.columns([1, 2])
+
+    with col1:
+        st.dataframe(stats.astype(str).rename('Value'), use_container_width=True)
+
+    with col2:
+        fig = px.bar(distribution, x='value', y='count', color_discrete_sequence=['#0055a1'])
+        fig.update_layout(bargap=0.02 if kind != 'categorical' else 0.2, xaxis_title=column, yaxis_title=None)
+        st.plotly_chart(fig, use_container_width=True)
 
 st.title("📊 Exploratory Data Analysis (EDA)")
 
-if 'df' in st.session_state:
+if 'dataset' in st.session_state:
+    dataset = st.session_state.dataset
+    df = dataset_store.get(dataset)
+
     st.write(f"Explore target {st.session_state.target}")
 
-    if "eda" not in st.session_state:
-        with st.spinner("Creating profiling report..."):
-            pr = generate_profile()
-            pr.to_file("./src/_static/eda_report.html")
-            st.session_state.eda = True
+    st.dataframe(get_overview(df, dataset), use_container_width=True, hide_index=True)
+
+    # Statistics are only computed for the columns somebody looks at
+    columns = st.multiselect(
+        "Columns to explore",
+        df.columns.to_list(),
+        default=[st.session_state.target] if st.session_state.target in df.columns else None
+    )
+
+    for column in columns:
+        st.subheader(column)
+        render_column(df, dataset, column)
 
-    html = open("./src/_static/eda_report.html", 'r', encoding='utf-8')
-    st.components.v1.html(html.read(), height=600, scrolling=True)
     st.session_state.eda = True
+
+    st.divider()
+
+    if st.toggle("Full profiling report (slow on large samples)"):
+        with st.spinner("Creating profiling report..."):
+            html = generate_profile(df, dataset, st.session_state.target, st.session_state.sample_size)
+
+        st.components.v1.html(html, height=600, scrolling=True)
 else:
-    st.warning("Upload dataset first for EDA.")
\ No newline at end of file
+    st.warning("Upload dataset first for EDA.")
@@ -1,62 +1,98 @@
+import datetime as dt
 import os
+import uuid
 import numpy as np
 import pandas as pd
+import plotly.express as px
 import streamlit as st
 
 from pathlib import Path
-from pycaret.regression import *
 from dotenv import load_dotenv
 
+from core.data import parquet_schema
+from core.domains import domain_index
+from core.explain import Explainer, background
+from core.registry import ModelRegistry
+from core.scoring import score_parquet
+from core.store import dataset_store
+
 load_dotenv()
 
+SCORES_DIR = Path('./src/_static/scores')
+
+registry = ModelRegistry()
+
 options = {}
 
-if Path('./src/_static/model/deployed_model.pkl').exists():
-    options['Deployed model'] = './src/_static/model/deployed_model'
+if registry.exists('deployed'):
+    options['Deployed model'] = 'deployed'
 
-if Path('./src/_static/model/uploaded_model.pkl').exists():
-    options['Uploaded model'] = './src/_static/model/uploaded_model'
+if registry.exists('uploaded'):
+    options['Uploaded model'] = 'uploaded'
 
-def select_model(option):
-    regression = RegressionExperiment()
-    return regression.load_model(options.get(option))
+for version in registry.versions():
+    if not version['aliases']:
+        label = f"{version.get('model', 'Model')} ({version['created'][:16].replace('T', ' ')}, {version['id'][:8]})"
+        options[label] = version['id']
 
-def render_form(df, target):
-    def render_input(column, unique_items):
+def select_model(option):
+    return registry.load(options.get(option))
+
+@st.cache_resource(max_entries=4)
+def get_explainer(version, dataset, target, _model, _df):
+    """Explainer of a model version, built once for all sessions."""
+    return Explainer(_model.steps[-1][1], _model[:-1].transform, background(_df.drop(columns=target)))
+
+def render_explanation(model, option, df, target, data):
+    try:
+        explainer = get_explainer(registry.version(options[option])['id'], st.session_state.dataset, target, model, df)
+    except Exception as e:
+        st.info(f"This model cannot be explained: {e}")
+        return
+
+    contributions = explainer.explain(data[df.columns.drop(target)]).iloc[0]
+    base_value = contributions.pop('base_value')
+    top = contributions.reindex(contributions.abs().sort_values(ascending=False).index).head(15)
+
+    fig = px.bar(
+        x=top.to_numpy(), y=top.index, orientation='h',
+        color=np.where(top.to_numpy() >= 0, 'raises', 'lowers'),
+        color_discrete_map={'raises': '#DA1C30', 'lowers': '#0055a1'}
+    )
+    fig.update_layout(xaxis_title=f"Contribution to {target}", yaxis_title=None, legend_title=None, yaxis={'autorange': 'reversed'})
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(f"Average prediction {base_value:,.2f}, SHAP values ({explainer.method}) of the {len(top)} most influential columns.")
+
+def render_form(df, target, domains):
+    def render_input(column, domain):
         sample = None if 'sample' not in st.session_state else st.session_state.sample.loc[column]
 
-        #st.write(df.dtypes)
-
-        if df[column].dtype == 'object':
-            idx = np.where(unique_items==sample)[0]
-            idx = None if len(idx) == 0 else int(idx[0])
-            value = st.selectbox(column, unique_items, placeholder="Choose an option", index=idx)
-        elif pd.core.dtypes.common.is_datetime_or_timedelta_dtype(df[column]):
+        if domain['kind'] == 'categorical':
+            idx = domain['positions'].get(sample)
+            value = st.selectbox(column, domain['values'], placeholder="Choose an option", index=idx)
+        elif domain['kind'] == 'datetime':
             date = st.date_input(f"{column} date", value=sample, format="DD.MM.YYYY")
             time = st.time_input(f"{column} time", value=sample)
-            value = pd.datetime.combine(date,time)
+            value = dt.datetime.combine(date, time)
+        elif domain['kind'] == 'boolean':
+            value = st.toggle(column + "?", value=sample)
         else:
-            if len(unique_items) == 2:
-                value = st.toggle(column + "?", value=sample)
-            else:
-                value = st.number_input(
-                    column,
-                    value=sample,
-                    min_value=unique_items.min(),
-                    max_value=unique_items.max(),
-                    help=f"Values from {unique_items.min()} to {unique_items.max()}")
+            value = st.number_input(
+                column,
+                value=sample,
+                min_value=domain['min'],
+                max_value=domain['max'],
+                help=f"Values from {domain['min']} to {domain['max']}")
 
         return value
 
     values = {}
     col1, col2 = st.columns(2)
-    for idx, column in enumerate(np.sort(df.drop(columns=[target]).columns)):
-        unique_items = df[column].sort_index().dropna().unique()
-
+    for idx, column in enumerate(sorted(c for c in df.columns if c != target)):
         if (idx % 2)+1 == 2:
-            with col2: values[column] = render_input(column, unique_items)
+            with col2: values[column] = render_input(column, domains[column])
         else:
-            with col1: values[column] = render_input(column, unique_items)
+            with col1: values[column] = render_input(column, domains[column])
 
     return pd.DataFrame([values])
 
@@ -64,20 +100,25 @@ st.title("🔎 Prediction Preview")
 
 st.write("Compare deployed and other uploaded models.")
 
-if "df" in st.session_state:
-    df = st.session_state.df
+if "dataset" in st.session_state:
+    df = dataset_store.get(st.session_state.dataset)
 
-    if "selected_model" in st.session_state:
-        target = "FLUG.baggage"
-        new_df = render_form(df, target)
+    if st.session_state.get("selected_model") in options:
+        target = st.session_state.target
+        domains = domain_index(df, st.session_state.dataset)
+        new_df = render_form(df, target, domains)
 
         if len(new_df.dropna()) > 0:
-            regression = st.session_state.reg
-            model = regression.load_model('./src/_static/model/deployed_model')
+            model = select_model(st.session_state.selected_model)
 
             with st.sidebar:
+                from pycaret.regression import predict_model
+
                 y_pred = predict_model(model, data=new_df)['prediction_label']
                 st.metric("Predict " + target, value=y_pred.iloc[0].round().astype(int))
+
+            with st.expander("Why this prediction?"):
+                render_explanation(model, st.session_state.selected_model, df, target, new_df)
         else:
             empty_columns = new_df.isna().any(axis=0)
             empty_columns = empty_columns[empty_columns == True].index.to_list()
@@ -99,13 +140,53 @@ if "df" in st.session_state:
     file = st.file_uploader("Upload model (as pickle):", type="pkl")
 
     if file:
-        with open('./src/_static/model/uploaded_model.pkl', 'wb') as tmp:
-            tmp.write(file.getvalue())
+        # Registered once per upload, not on every rerun while it stays in the uploader
+        if st.session_state.get('uploaded_model', (None,))[0] != file.file_id:
+            version = registry.register(file.getvalue(), alias='uploaded', model=file.name)
+            st.session_state.uploaded_model = (file.file_id, version['id'])
+        model = registry.load(st.session_state.uploaded_model[1])
+
+        st.write(model)
+
+else:
+    st.warning("First upload a dataset and/or train a model.")
+
+st.divider()
+
+st.subheader("Batch scoring")
+
+if options:
+    st.write("Score a large Parquet file in chunks with one of the models.")
+
+    batch_option = st.selectbox("Model", options.keys(), key='batch_model')
+    batch_file = st.file_uploader("Parquet file to score:", type="parquet", key='batch_file')
+
+    if batch_file:
+        schema, rows = parquet_schema(batch_file)
+        keep = st.multiselect("Columns to keep next to the predictions", schema['Column'].to_list())
+
+        if st.button(f"Score {rows:,} rows", type="primary"):
+            if 'scored' in st.session_state:
+                Path(st.session_state.scored).unlink(missing_ok=True)
+
+            SCORES_DIR.mkdir(parents=True, exist_ok=True)
+            output = SCORES_DIR / f"{uuid.uuid4().hex}.parquet"
+            bar = st.progress(0.0, text="Scoring...")
 
-            regression = RegressionExperiment()
-            model = regression.load_model('./src/_static/model/uploaded_model')
+            def progress(done, total, rate):
+                bar.progress(done / max(total, 1), text=f"{done:,} / {total:,} rows ({rate:,.0f} rows/s)")
 
-            st.write(model)
+            done, seconds = score_parquet(select_model(batch_option), batch_file, output, keep=keep, progress=progress)
+            st.session_state.scored = str(output)
+            st.success(f"Scored {done:,} rows in {seconds:,.1f}s ({done / max(seconds, 1e-9):,.0f} rows/s).")
 
+    if 'scored' in st.session_state and Path(st.session_state.scored).exists():
+        with open(st.session_state.scored, "rb") as fp:
+            st.download_button(
+                "⬇️ Download predictions",
+                data=fp,
+                mime='application/vnd.apache.parquet',
+                file_name=f"predictions_{dt.datetime.today().strftime('%Y%m%d%H%M%S')}.parquet"
+            )
 else:
-    st.warning("First upload a dataset and/or train a model.")
\ No newline at end of file
+    st.info("No model available yet.")
\ No newline at end of file
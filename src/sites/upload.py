@@ -1,20 +1,84 @@
-import pandas as pd
 import os
 import plotly.express as px
 import streamlit as st
 
-from streamlit_extras.dataframe_explorer import dataframe_explorer
 from dotenv import load_dotenv
 
+from core import explorer
+from core.data import parquet_schema, read_parquet
+from core.domains import domain_index
+from core.store import dataset_store
+
 st.title("🗄️ Dataset")
 
+# Cached by the id of the upload, hashing the file itself would read all of it on every rerun
 @st.cache_data
-def load_data():
-    """Generate dataframe with sample size."""
-    df = pd.read_parquet(file)
-    return df
+def load_schema(file_id, _file):
+    return parquet_schema(_file)
 
-if 'df' in st.session_state:
+@st.cache_data
+def load_data(file_id, columns, _file):
+    """Load selected columns row group by row group with compact dtypes.
+
+    Returns the key of the dataset in the shared store, not the dataframe,
+    so sessions loading the same data share one copy.
+    """
+    df, report = read_parquet(_file, columns)
+    return dataset_store.put(df), report
+
+@st.cache_data(max_entries=64)
+def get_filter_options(dataset, column):
+    """Filter operation of a column and its bounds or distinct values."""
+    data = dataset_store.dataset(dataset)
+    if explorer.kind(data.schema.field(column)) == 'range':
+        return 'range', explorer.bounds(data, column)
+    values = explorer.choices(data, column)
+    return ('in', values) if values is not None else ('contains', None)
+
+@st.cache_data(max_entries=64)
+def get_count(dataset, filters):
+    return explorer.count(dataset_store.dataset(dataset), filters)
+
+@st.cache_data(max_entries=64)
+def get_page(dataset, columns, filters, number):
+    return explorer.page(dataset_store.dataset(dataset), list(columns), filters, number)
+
+@st.cache_data(max_entries=16)
+def get_histogram(dataset, column, filters=()):
+    return explorer.histogram(dataset_store.dataset(dataset), column, filters)
+
+def megabytes(size):
+    return f"{size / 1024**2:,.1f} MB"
+
+@st.fragment
+def show_preview(dataset, columns):
+    """Filtered pages of the stored dataset, read on the server page by page."""
+    filters = []
+    for column in st.multiselect("Filter by", columns):
+        op, options = get_filter_options(dataset, column)
+        if op == 'range':
+            if options is None or options[0] == options[1]:
+                st.caption(f"{column} has a single value only.")
+                continue
+            filters.append((column, op, st.slider(column, min_value=options[0], max_value=options[1], value=options)))
+        elif op == 'in':
+            values = st.multiselect(column, options)
+            if values:
+                filters.append((column, op, tuple(values)))
+        else:
+            text = st.text_input(f"{column} contains")
+            if text:
+                filters.append((column, op, text))
+    filters = tuple(filters)
+
+    rows = get_count(dataset, filters)
+    pages = max(1, -(-rows // explorer.PAGE_SIZE))
+
+    number = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1)
+    st.dataframe(get_page(dataset, tuple(columns), filters, number - 1), use_container_width=True, hide_index=True)
+    st.caption(f"{rows:,} matching rows, {explorer.PAGE_SIZE} per page.")
+
+if 'dataset' in st.session_state:
     st.info("Dataset successfully uploaded!")
 
     st.write("Want to restart and load another dataset?")
@@ -23,12 +87,13 @@ if 'df' in st.session_state:
 
     if status:
         del st.session_state.target
-        del st.session_state.df
+        del st.session_state.dataset
         if 'eda' in st.session_state: del st.session_state.eda
         if 'reg' in st.session_state: del st.session_state.reg
         if 'api' in st.session_state: del st.session_state.api
         if 'deployed' in st.session_state: del st.session_state.deployed
         if 'sample_size' in st.session_state: del st.session_state.sample_size
+        if 'selection' in st.session_state: del st.session_state.selection
         st.switch_page("./sites/upload.py")
         
 else:
@@ -38,53 +103,106 @@ else:
         file = st.file_uploader("Prepared Dataset:", type="parquet")
 
     if file:
-        if 'df' not in st.session_state:
-            df = load_data()
-            st.success("Upload complete.")
-
-        st.markdown('**How many random samples do you want to use?**')
-
-        number = st.number_input(
-            f"Insert a sample size (0 - {len(df)})",
-            value=len(df),
-            min_value=0,
-            max_value=len(df),
-            step=1)
-            
+        schema, rows = load_schema(file.file_id, file)
+
+        with st.expander(f"Schema ({len(schema)} columns, {rows} rows)"):
+            st.dataframe(schema, use_container_width=True, hide_index=True)
+
+        # Nothing is read until the selection is confirmed
+        with st.form("columns"):
+            st.write("Select columns for training. Only these columns are loaded.")
+            columns = st.multiselect("Columns", schema['Column'].to_list(), default=schema['Column'].to_list())
+            submitted = st.form_submit_button("Load", type="primary")
+
+        if submitted:
+            if not columns:
+                st.error("Select at least one column.")
+                st.stop()
+            st.session_state.selection = (file.file_id, tuple(columns))
+
+        if st.session_state.get('selection', (None,))[0] != file.file_id:
+            st.stop()
+        columns = list(st.session_state.selection[1])
+
+        with st.spinner('Load selected columns...'):
+            dataset, report = load_data(file.file_id, columns, file)
+            df = dataset_store.get(dataset)
+            if df is None:
+                # Dropped from the store meanwhile, load it again
+                load_data.clear()
+                dataset, report = load_data(file.file_id, columns, file)
+                df = dataset_store.get(dataset)
+        st.success("Upload complete.")
+
+        st.write(
+            f"Memory: {megabytes(report['after'])} loaded instead of about "
+            f"{megabytes(report['before'])} for the selected columns as plain dataframe "
+            f"(Parquet uncompressed: {megabytes(report['file'])} for all columns)."
+        )
+
+        st.markdown('**How many samples do you want to use?**')
+
+        sampling_mode = st.radio(
+            "Sample size",
+            ('auto', 'fixed'),
+            format_func=lambda x: {
+                'auto': 'Automatic (grow the sample until the model stops improving)',
+                'fixed': 'Fixed',
+            }[x],
+            horizontal=True
+        )
+
+        if sampling_mode == 'fixed':
+            number = st.number_input(
+                f"Insert a sample size (0 - {len(df)})",
+                value=len(df),
+                min_value=0,
+                max_value=len(df),
+                step=1)
+        else:
+            number = None
+
+        # Samples are stratified on the label and the same on every rerun
         st.session_state.sample_size = number
-        percentage = round(st.session_state.sample_size / len(df) * 100)
+        percentage = None if number is None else round(number / len(df) * 100)
 
         st.write("Amount entries: ", df.shape[0])
         st.write("Amount features: ", df.shape[1])
-        st.write("Sample size in %: ", percentage)
+        if percentage is not None:
+            st.write("Sample size in %: ", percentage)
 
-        if st.session_state.sample_size > 0:
+        if st.session_state.sample_size != 0:
 
             st.subheader("Step 2: Preview dataset")
 
-            st.write("Lets look at the first entry.")
+            st.write("Lets look at the data. Only the rows of the current page are loaded.")
 
-            filtered_df = dataframe_explorer(df, case=False)
-            st.dataframe(filtered_df, use_container_width=True, hide_index=True)
+            show_preview(dataset, list(df.columns))
 
             st.subheader("Step 3: Select data")
 
-            st.write("Select label and columns for training.")
+            st.write("Select label for training.")
 
-            columns = st.multiselect("Columns", df.columns.to_list(), default=df.columns.to_list())
             target = st.selectbox("Label", placeholder="Choose item...", options=df.columns, index=None)
 
             if st.button('Save'):
                 if target:
-                    st.info(f"Choose {st.session_state.sample_size} random samples ({percentage}%).")
+                    if st.session_state.sample_size is None:
+                        st.info("The sample size is chosen automatically during training.")
+                    else:
+                        st.info(f"Choose {st.session_state.sample_size} random samples ({percentage}%).")
 
                     st.session_state.target = target
-                    st.session_state.df = df[columns]
+                    st.session_state.dataset = dataset
+
+                    # Input domains for the prediction form
+                    domain_index(df, st.session_state.dataset)
 
                     st.markdown('**Distribution of target value**')
 
-                    # Create distplot with custom bin_size
-                    fig = px.histogram(df, x=target)
+                    # Binned on the server, the chart only gets the counts
+                    fig = px.bar(get_histogram(dataset, target), x='value', y='count', color_discrete_sequence=['#0055a1'])
+                    fig.update_layout(bargap=0.02, xaxis_title=target, yaxis_title=None)
 
                     # Plot!
                     st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,6 @@
+import sys
+
+from pathlib import Path
+
+# The app imports its modules relative to src, like `streamlit run src/server.py`
+sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
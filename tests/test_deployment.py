@@ -0,0 +1,41 @@
+import importlib.util
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('pycaret')
+pytest.importorskip('fastapi')
+pytest.importorskip('uvicorn')
+
+from core.deployment import build_deployment
+
+
+@pytest.fixture(scope='module')
+def regression():
+    from pycaret.regression import RegressionExperiment
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'a': rng.random(200), 'b': rng.choice(['x', 'y'], 200)})
+    df['y'] = 2 * df['a'] + (df['b'] == 'x') + rng.normal(0, 0.1, 200)
+
+    experiment = RegressionExperiment()
+    experiment.setup(df, target='y', session_id=0, n_jobs=1, verbose=False, html=False)
+    return experiment
+
+
+@pytest.mark.parametrize('mode', ['pipeline', 'compiled'])
+def test_generated_api_imports(regression, tmp_path, monkeypatch, mode):
+    model = regression.create_model('lr', cross_validation=False, verbose=False)
+    features = regression.get_config('X')
+
+    built = build_deployment(tmp_path, regression, model, features, 'y_api', mode=mode)
+    assert built['mode'] == mode
+
+    # The service loads its files relative to the directory it is started in
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location('y_api', tmp_path / 'y_api.py')
+    api = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api)
+
+    assert len(api.predict_frame(features.head())) == 5